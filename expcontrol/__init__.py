@@ -1,7 +1,16 @@
 '''expcontrol - control psychology and neuroscience experiments.'''
-import expcontrol.base
-import expcontrol.event
+from expcontrol.lazy import LazyModule
+# submodules are imported on first use (see expcontrol.lazy)
+adaptive = LazyModule('expcontrol.adaptive')
+align = LazyModule('expcontrol.align')
+audit = LazyModule('expcontrol.audit')
+base = LazyModule('expcontrol.base')
+event = LazyModule('expcontrol.event')
+eyelinkasc = LazyModule('expcontrol.eyelinkasc')
+realtime = LazyModule('expcontrol.realtime')
+stats = LazyModule('expcontrol.stats')
+telemetry = LazyModule('expcontrol.telemetry')
 # NB no automatic import of modules with external dependencies
-# (psychopydep, eyelinkdep)
-__all__ = ['base', 'event']
+# (psychopydep, eyelinkdep, simulation)
+__all__ = ['adaptive', 'align', 'audit', 'base', 'event', 'eyelinkasc', 'realtime', 'stats', 'telemetry']
 __version__ = '0.2.3'
@@ -0,0 +1,267 @@
+'''
+Adaptive threshold procedures for expcontrol. Staircase and GridPosterior
+pick the stimulus intensity for the next trial and are updated with the
+score of the current one. AdaptiveEvent plugs either into DecisionEvent
+scoring.
+'''
+import numpy
+from .event import DecisionEvent
+
+class Staircase(object):
+    '''
+    Transformed up/down staircase (e.g., nup=1, ndown=3 converges on ~79%
+    correct). Intensity decreases after ndown consecutive correct trials and
+    increases after nup consecutive incorrect trials.
+    '''
+
+    def __init__(self, start, stepdown, stepup=None, ndown=3, nup=1,
+                 minval=-numpy.inf, maxval=numpy.inf):
+        '''
+        Initialise a Staircase instance.
+
+        Arguments:
+        start -- initial intensity.
+        stepdown -- step size after ndown correct trials.
+
+        Keyword arguments:
+        stepup=None -- step size after nup incorrect trials (default
+            stepdown).
+        ndown=3 -- consecutive correct trials before stepping down.
+        nup=1 -- consecutive incorrect trials before stepping up.
+        minval, maxval -- intensities are clipped to this range.
+        '''
+        if stepup is None:
+            stepup = stepdown
+        self.intensity = start
+        self.stepdown = stepdown
+        self.stepup = stepup
+        self.ndown = ndown
+        self.nup = nup
+        self.minval = minval
+        self.maxval = maxval
+        self.ncorrect = 0
+        self.nincorrect = 0
+        self.direction = 0
+        self.reversals = []
+        return
+
+    def __call__(self):
+        '''return the intensity for the next trial.'''
+        return self.intensity
+
+    def update(self, intensity, score):
+        '''update the staircase with the score (1 for correct, 0 for
+        incorrect) of a trial presented at intensity.'''
+        direction = 0
+        if score == 1:
+            self.ncorrect += 1
+            self.nincorrect = 0
+            if self.ncorrect >= self.ndown:
+                direction = -1
+        else:
+            self.nincorrect += 1
+            self.ncorrect = 0
+            if self.nincorrect >= self.nup:
+                direction = 1
+        if not direction:
+            return
+        self.ncorrect = 0
+        self.nincorrect = 0
+        if self.direction and direction != self.direction:
+            self.reversals.append(intensity)
+        self.direction = direction
+        step = self.stepup if direction > 0 else -self.stepdown
+        self.intensity = numpy.clip(intensity + step, self.minval, self.maxval)
+        return
+
+    def estimate(self, nreversals=6):
+        '''threshold estimate as the mean of the last nreversals reversals.'''
+        if not self.reversals:
+            return numpy.nan
+        return numpy.mean(self.reversals[-nreversals:])
+
+class GridPosterior(object):
+    '''
+    Grid-based Bayesian threshold estimation (QUEST-style). The posterior
+    over thresholds and the psychometric function for every candidate
+    intensity are held in preallocated arrays, so updates and next-stimulus
+    selection are single vectorized numpy operations.
+
+    The psychometric function is a Weibull on the intensity scale (use log
+    units for QUEST-like behaviour):
+        p(correct) = guess + (1-guess-lapse) *
+            (1 - exp(-10**(slope * (intensity - threshold))))
+    '''
+
+    def __init__(self, intensities, thresholds=None, prior=None, slope=3.5,
+                 guess=.5, lapse=.01, method='entropy'):
+        '''
+        Initialise a GridPosterior instance.
+
+        Arguments:
+        intensities -- array of candidate stimulus intensities.
+
+        Keyword arguments:
+        thresholds=None -- grid of candidate thresholds (default
+            intensities).
+        prior=None -- prior over thresholds (default uniform).
+        slope, guess, lapse -- psychometric function parameters.
+        method='entropy' -- next stimulus selection. 'entropy' minimises
+            the expected posterior entropy, 'mean' and 'mode' present the
+            intensity closest to the posterior mean or mode.
+        '''
+        self.intensities = numpy.asarray(intensities, dtype=float)
+        if thresholds is None:
+            thresholds = self.intensities
+        self.thresholds = numpy.asarray(thresholds, dtype=float)
+        if prior is None:
+            prior = numpy.ones(self.thresholds.shape)
+        self.posterior = numpy.asarray(prior, dtype=float).copy()
+        self.posterior /= self.posterior.sum()
+        assert method in ('entropy', 'mean', 'mode'), \
+                'unknown method: ' + method
+        self.method = method
+        # likelihood of a correct response for each intensity (rows) and
+        # threshold (columns)
+        delta = self.intensities[:, None] - self.thresholds[None, :]
+        self.pcorrect = guess + (1.-guess-lapse) * \
+                (1. - numpy.exp(-10.**(slope * delta)))
+        self.pincorrect = 1. - self.pcorrect
+        # workspace for next-stimulus selection
+        self.joint = numpy.empty(self.pcorrect.shape)
+        self.logpost = numpy.empty(self.pcorrect.shape)
+        self.iszero = numpy.empty(self.pcorrect.shape, dtype=bool)
+        self.marginal = numpy.empty(self.intensities.shape)
+        self.entropy = numpy.empty(self.intensities.shape)
+        return
+
+    def intensityindex(self, intensity):
+        '''index of the candidate intensity closest to intensity.'''
+        return numpy.argmin(numpy.abs(self.intensities - intensity))
+
+    def update(self, intensity, score):
+        '''update the posterior with the score (1 for correct, 0 for
+        incorrect) of a trial presented at intensity.'''
+        ind = self.intensityindex(intensity)
+        if score == 1:
+            self.posterior *= self.pcorrect[ind]
+        else:
+            self.posterior *= self.pincorrect[ind]
+        self.posterior /= self.posterior.sum()
+        return
+
+    def outcomeentropy(self, likelihood):
+        '''
+        add the expected posterior entropy contribution of one response
+        outcome for every candidate intensity to self.entropy. Used
+        internally by __call__.
+        '''
+        numpy.multiply(likelihood, self.posterior, out=self.joint)
+        self.joint.sum(axis=1, out=self.marginal)
+        # joint * log(joint / marginal), with 0 log 0 = 0
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            numpy.divide(self.joint, self.marginal[:, None], out=self.logpost)
+            numpy.log(self.logpost, out=self.logpost)
+        numpy.equal(self.joint, 0., out=self.iszero)
+        numpy.copyto(self.logpost, 0., where=self.iszero)
+        numpy.multiply(self.joint, self.logpost, out=self.logpost)
+        self.entropy -= self.logpost.sum(axis=1)
+        return
+
+    def __call__(self):
+        '''return the intensity for the next trial.'''
+        if self.method == 'mean':
+            return self.intensities[self.intensityindex(self.estimate()[0])]
+        if self.method == 'mode':
+            return self.intensities[self.intensityindex(
+                self.thresholds[numpy.argmax(self.posterior)])]
+        self.entropy.fill(0.)
+        self.outcomeentropy(self.pcorrect)
+        self.outcomeentropy(self.pincorrect)
+        return self.intensities[numpy.argmin(self.entropy)]
+
+    def estimate(self):
+        '''return posterior mean and standard deviation of the threshold.'''
+        mean = numpy.dot(self.posterior, self.thresholds)
+        sd = numpy.sqrt(numpy.dot(self.posterior, (self.thresholds-mean)**2))
+        return mean, sd
+
+class AdaptiveEvent(DecisionEvent):
+    '''
+    DecisionEvent subclass where the stimulus intensity is set on each call
+    by an adaptive procedure (e.g., Staircase or GridPosterior), which is
+    then updated with the trial's score at the end of the event. The
+    intensity is returned from oncall and the score used for the update from
+    onend, so both end up in the event log.
+
+    The next intensity is chosen in onend, right after the update, so that
+    the search runs after the stimulus (overruns are recovered in the
+    following events, see EventSeqAbsTime lagpolicy) and oncall only
+    applies it.
+    '''
+
+    def __init__(self, drawinstances, procedure, setintensity, omitscore=None,
+                 **kwargs):
+        '''
+        Initialise an AdaptiveEvent instance.
+
+        Arguments:
+        drawinstances -- see DrawEvent
+        procedure -- instance with __call__ (return next intensity) and
+            update(intensity, score) methods.
+        setintensity -- callable that applies the intensity to the stimuli
+            (e.g., lambda x: grating.setContrast(x)).
+
+        Keyword arguments:
+        omitscore=None -- score used to update the procedure on trials
+            without a scored response. If None, such trials are not used.
+        kwargs -- any additional arguments are passed to DecisionEvent.'''
+        super(AdaptiveEvent, self).__init__(drawinstances, **kwargs)
+        self.procedure = procedure
+        self.setintensity = setintensity
+        self.omitscore = omitscore
+        self.intensity = numpy.nan
+        self.nextintensity = procedure()
+        self.trialscore = numpy.nan
+        return
+
+    def oncall(self, controller, currentevlog, currentresplog):
+        '''
+        oncall callback for AdaptiveEvent. Sets the intensity for this trial
+        (chosen at the end of the previous one) and returns it for logging.
+        '''
+        super(AdaptiveEvent, self).oncall(controller, currentevlog,
+                                          currentresplog)
+        self.intensity = self.nextintensity
+        self.setintensity(self.intensity)
+        self.trialscore = numpy.nan
+        return self.intensity
+
+    def onresponse(self, controller, response, responsetime, currentevlog, currentresplog):
+        '''
+        onresponse callback for AdaptiveEvent. Scoring is as in
+        DecisionEvent, and the first scored response is kept for the
+        procedure update.
+        '''
+        wascorrect, rt = super(AdaptiveEvent, self).onresponse(
+            controller, response, responsetime, currentevlog, currentresplog)
+        scored = wascorrect[~numpy.isnan(wascorrect)]
+        if numpy.isnan(self.trialscore) and len(scored):
+            self.trialscore = scored[0]
+        return wascorrect, rt
+
+    def onend(self, controller, currentevlog, currentresplog):
+        '''
+        onend callback for AdaptiveEvent. Updates the procedure, chooses
+        the intensity for the next trial and returns the score that was used
+        (nan if the trial was skipped).
+        '''
+        super(AdaptiveEvent, self).onend(controller, currentevlog,
+                                         currentresplog)
+        score = self.trialscore
+        if numpy.isnan(score) and self.omitscore is not None:
+            score = self.omitscore
+        if not numpy.isnan(score):
+            self.procedure.update(self.intensity, score)
+            self.nextintensity = self.procedure()
+        return score
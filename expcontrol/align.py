@@ -0,0 +1,124 @@
+'''
+Align the streams recorded during a run (responses, scanner pulses, eye
+tracker samples) to the events in eventlog. Each time stamp is assigned to
+its enclosing event with a sorted-array search (an as-of join on the event
+onsets), after an optional linear clock correction, so there is no
+per-row Python work even for tens of millions of samples.
+'''
+import numpy
+from .lazy import LazyModule
+pandas = LazyModule('pandas')
+
+def fitclock(source, target, maxresidual=.05):
+    '''
+    Least-squares linear mapping (slope, intercept) from source to target
+    times, which corrects both offset and drift between two clocks. Pairs
+    with residuals above maxresidual (target units) after a first fit are
+    excluded from a second fit.
+    '''
+    source = numpy.asarray(source, dtype=float)
+    target = numpy.asarray(target, dtype=float)
+    assert len(source) >= 2, 'need at least 2 matched times to fit clock'
+    slope, intercept = numpy.polyfit(source, target, 1)
+    keep = numpy.abs(target - (slope * source + intercept)) <= maxresidual
+    if 2 <= numpy.sum(keep) < len(source):
+        slope, intercept = numpy.polyfit(source[keep], target[keep], 1)
+    return slope, intercept
+
+def correcttime(times, correction=None):
+    '''
+    Apply a clock correction to times. correction is None (no change), a
+    scalar offset that is added, or a (slope, intercept) tuple as returned by
+    fitclock.
+    '''
+    times = numpy.asarray(times, dtype=float)
+    if correction is None:
+        return times
+    if numpy.isscalar(correction):
+        return times + correction
+    slope, intercept = correction
+    return slope * times + intercept
+
+def assignevents(times, eventlog, correction=None, strict=False):
+    '''
+    Assign each of times to the last event in eventlog with an onset at or
+    before it. Returns a pandas DataFrame (one row per time, same order)
+    with columns:
+
+    alignedtime -- corrected time (see correcttime).
+    event -- row position in eventlog (-1 if before the first event or, if
+        strict, after the event's offset).
+    name, condition -- of the assigned event (categorical).
+    eventtime -- time relative to the event onset.
+    inevent -- True if time is before the event's actual offset (always True
+        for logs without an offset column).
+    '''
+    times = correcttime(times, correction)
+    onsets = eventlog.index.values.astype(float)
+    order = numpy.argsort(onsets, kind='mergesort')
+    ind = numpy.searchsorted(onsets[order], times, side='right') - 1
+    valid = ind >= 0
+    event = numpy.where(valid, order[numpy.maximum(ind, 0)], -1)
+    inevent = valid.copy()
+    if 'offset' in eventlog:
+        offsets = eventlog['offset'].values.astype(float)
+        inevent[valid] = times[valid] < offsets[event[valid]]
+    if strict:
+        event[~inevent] = -1
+    aligned = pandas.DataFrame({'alignedtime': times, 'event': event},
+                               columns=['alignedtime', 'event'])
+    for key in ('name', 'condition'):
+        codes, uniques = pandas.factorize(eventlog[key].values)
+        eventcodes = numpy.where(event >= 0, codes[numpy.maximum(event, 0)],
+                                 -1)
+        aligned[key] = pandas.Categorical.from_codes(eventcodes, uniques)
+    eventtime = numpy.empty(times.shape)
+    eventtime.fill(numpy.nan)
+    eventtime[event >= 0] = times[event >= 0] - onsets[event[event >= 0]]
+    aligned['eventtime'] = eventtime
+    aligned['inevent'] = inevent
+    return aligned
+
+def alignstreams(eventlog, resplog=None, pulsetimes=None, periodhistory=None,
+                 samples=None, sampletime='clocktime', corrections={},
+                 strict=False):
+    '''
+    Assign responses, pulses and eye tracker samples to the events in
+    eventlog (see assignevents). Returns a dict with a DataFrame for each
+    stream that was provided (responses, pulses, samples), where the stream's
+    own columns are followed by the assignment columns.
+
+    Keyword arguments:
+    resplog -- response log indexed by controller.clock time.
+    pulsetimes -- pulse times (e.g. PulseClock.pulsehistory).
+    periodhistory -- period estimates that go with pulsetimes (e.g.
+        PulseClock.periodhistory), added as a period column.
+    samples -- DataFrame of eye tracker samples (e.g. from
+        expcontrol.eyelinkasc.alignasc).
+    sampletime='clocktime' -- column of samples with time stamps.
+    corrections -- dict of clock corrections keyed by stream name (see
+        correcttime).
+    strict=False -- see assignevents.
+    '''
+    streams = {}
+    if resplog is not None:
+        streams['responses'] = (resplog.reset_index(drop=True),
+                                resplog.index.values)
+    if pulsetimes is not None:
+        pulses = pandas.DataFrame(index=numpy.arange(len(pulsetimes)))
+        if periodhistory is not None and \
+                len(periodhistory) == len(pulsetimes):
+            pulses['period'] = periodhistory
+        streams['pulses'] = (pulses, pulsetimes)
+    if samples is not None:
+        streams['samples'] = (samples.reset_index(drop=True),
+                              samples[sampletime].values)
+    aligned = {}
+    for key, (data, times) in streams.items():
+        assigned = assignevents(times, eventlog,
+                                correction=corrections.get(key),
+                                strict=strict)
+        assigned.index = data.index
+        data = data.drop(columns=[col for col in assigned if col in data])
+        aligned[key] = pandas.concat([data, assigned], axis=1)
+    return aligned
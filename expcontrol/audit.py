@@ -0,0 +1,93 @@
+'''
+Post-run timing audit of expcontrol event logs. Uses the scheduled and
+actual timing columns (see event.TIMINGKEYS) to report per-event lag,
+cumulative drift and pulse alignment. All computations are vectorized, so
+the functions can be run over concatenated logs from many sessions.
+'''
+import numpy
+from .lazy import LazyModule
+pandas = LazyModule('pandas')
+
+def timingaudit(eventlog, pulsetimes=None):
+    '''
+    Return a pandas DataFrame with one row per event in eventlog (same
+    index) and the following columns:
+
+    name, condition -- copied from eventlog.
+    onsetlag -- actual minus scheduled onset. Because the schedule of a
+        sequence is the one where every event lasts its nominal duration,
+        this is the drift accumulated up to the event.
+    overrun -- actual offset minus the deadline the event was given (how
+        late the event ended).
+    truncation -- nominal minus available duration (how much the event was
+        squeezed to catch up with the schedule, nan for self-timed events).
+    drift -- change in onsetlag since the first event (per session if the
+        log has a session column).
+    resynch -- schedule correction at each detected pulse (SynchEvent rows
+        in EventSeqSynchTime, nan otherwise).
+    pulselag -- onset minus the preceding pulse (only if pulsetimes is
+        provided, e.g. from PulseClock.pulsehistory).
+    '''
+    onset = eventlog.index.values.astype(float)
+    scheduledonset = eventlog['scheduledonset'].values.astype(float)
+    scheduledoffset = eventlog['scheduledoffset'].values.astype(float)
+    deadline = eventlog['deadline'].values.astype(float)
+    offset = eventlog['offset'].values.astype(float)
+    audit = pandas.DataFrame({'name': eventlog['name'].values,
+                              'condition': eventlog['condition'].values},
+                             index=eventlog.index,
+                             columns=['name', 'condition'])
+    with numpy.errstate(invalid='ignore'):
+        audit['onsetlag'] = onset - scheduledonset
+        overrun = offset - deadline
+        overrun[~numpy.isfinite(deadline)] = numpy.nan
+        audit['overrun'] = overrun
+        truncation = (scheduledoffset - scheduledonset) - (deadline - onset)
+        truncation[~numpy.isfinite(truncation)] = numpy.nan
+        audit['truncation'] = truncation
+    if 'session' in eventlog:
+        audit['session'] = eventlog['session'].values
+        firstlag = audit.groupby('session')['onsetlag'].transform('first')
+    else:
+        firstlag = audit['onsetlag'].iloc[0] if len(audit) else numpy.nan
+    audit['drift'] = audit['onsetlag'] - firstlag
+    audit['resynch'] = eventlog['resynch'].values.astype(float)
+    if pulsetimes is not None:
+        pulsetimes = numpy.sort(numpy.asarray(pulsetimes, dtype=float))
+        ind = numpy.searchsorted(pulsetimes, onset, side='right') - 1
+        pulselag = numpy.empty(onset.shape)
+        pulselag.fill(numpy.nan)
+        valid = ind >= 0
+        pulselag[valid] = onset[valid] - pulsetimes[ind[valid]]
+        audit['pulselag'] = pulselag
+    return audit
+
+def auditsummary(audit, nworst=3):
+    '''
+    Summarise the output of timingaudit per condition (and session, if
+    present). Returns a pandas DataFrame with the number of events, mean and
+    max onsetlag and overrun, max truncation, final drift and the names
+    and onsets of the nworst events by overrun.
+    '''
+    keys = ['condition']
+    if 'session' in audit:
+        keys = ['session', 'condition']
+    # groupby drops nan keys, so label events outside any condition
+    audit = audit.copy()
+    audit['condition'] = audit['condition'].fillna('none')
+    grouped = audit.groupby(keys)
+    summary = grouped.agg({'onsetlag': ['mean', 'max'],
+                           'overrun': ['mean', 'max'],
+                           'truncation': 'max',
+                           'drift': 'last'})
+    summary.columns = ['_'.join(col) for col in summary.columns.values]
+    summary['nevents'] = grouped.size()
+    summary = summary[['nevents', 'onsetlag_mean', 'onsetlag_max',
+                       'overrun_mean', 'overrun_max', 'truncation_max',
+                       'drift_last']]
+    ranked = audit.assign(onset=audit.index.values).sort_values(
+        'overrun', ascending=False, na_position='last')
+    worst = ranked.groupby(keys).head(nworst)
+    summary['worst'] = worst.groupby(keys).apply(
+        lambda x: list(zip(x['name'], x['onset'], x['overrun'])))
+    return summary
@@ -1,6 +1,8 @@
 '''base expcontrol functionality.'''
 import datetime
 import functools
+import gc
+import time
 import numpy
 from . import event
 
@@ -25,25 +27,314 @@ class Controller(object):
     Control experiment timing, stimulus delivery and response collection.
     '''
 
-    def __init__(self, window=None, response=None, clock=None, eyetracker=None):
+    def __init__(self, window=None, response=None, clock=None, eyetracker=None,
+                 telemetry=None, frameperiod=None, stats=None,
+                 frametrace=None, gcmode=None, gcbudget=.005, realtime=None):
         '''
         Initialise a controller instance. For example inputs, see
-        expcontrol.psychopydep.window, KeyboardResponse and clock.'''
+        expcontrol.psychopydep.window, KeyboardResponse and clock.
+
+        Keyword arguments:
+        telemetry -- optional expcontrol.telemetry.TelemetryPublisher for live
+            monitoring of progress from a separate process.
+        frameperiod -- expected duration of a frame in clock units. If
+            defined, flips that arrive more than 1.5 periods after the
+            previous one within the same event are counted in
+            self.nframedrops.
+        stats -- optional expcontrol.stats.RunningStats instance, updated as
+            responses are scored.
+        frametrace -- optional expcontrol.event.FrameTrace instance for
+            frame-by-frame logging in events with frametrace=True. If
+            frameperiod is defined, the buffer is sized for each event
+            before its frame loop starts.
+        gcmode -- garbage collector control while the controller is active
+            (see __enter__). None leaves the collector alone, 'disable'
+            turns off automatic collection so that collections only happen
+            at safe points (see collect), 'freeze' additionally moves all
+            objects that exist on entry to a permanent generation, so that
+            safe-point collections only scan objects created during the run
+            (Python 3.7+, otherwise same as 'disable').
+        gcbudget=.005 -- minimum time (clock units) left before the next
+            deadline for a safe-point collection to run.
+        realtime -- optional expcontrol.realtime.RealtimeMode instance,
+            entered while the controller is active (see __enter__).'''
         self.window = window
         self.response = response
         self.clock = clock
         self.eyetracker = eyetracker
+        self.telemetry = telemetry
+        self.frameperiod = frameperiod
+        self.stats = stats
+        self.frametrace = frametrace
+        self.nframedrops = 0
+        self.lastframetime = numpy.inf
+        assert gcmode in (None, 'disable', 'freeze'), \
+                'unknown gcmode: ' + str(gcmode)
+        self.gcmode = gcmode
+        self.gcbudget = gcbudget
+        self.realtime = realtime
+        self.gcenabled = gc.isenabled()
+        # total duration (s) and number of safe-point collections
+        self.gcpause = 0.
+        self.ncollections = 0
         return
 
+    def __enter__(self):
+        '''
+        Enter timing-critical mode for the duration of a run (see
+        Experiment.__call__). The garbage collector is set up according to
+        self.gcmode after a full collection, self.realtime is entered if
+        defined and self.frametrace is cleared.'''
+        if self.frametrace is not None:
+            self.frametrace.clear()
+        if self.realtime:
+            self.realtime.__enter__()
+        if self.gcmode:
+            self.gcenabled = gc.isenabled()
+            gc.collect()
+            gc.disable()
+            if self.gcmode == 'freeze' and hasattr(gc, 'freeze'):
+                gc.freeze()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        '''
+        leave timing-critical mode and restore the garbage collector, after
+        a full collection of anything the safe points left behind.'''
+        if self.gcmode:
+            if self.gcmode == 'freeze' and hasattr(gc, 'unfreeze'):
+                gc.unfreeze()
+            gc.collect()
+            if self.gcenabled:
+                gc.enable()
+        if self.realtime:
+            self.realtime.__exit__(exc_type, exc_value, traceback)
+        return False
+
+    def collect(self, deadline=numpy.inf, generation=2):
+        '''
+        Run a garbage collection at a safe point (the start of an Event with
+        minduration < duration, or a catch-up wait in EventSeq) if
+        self.gcmode is set and there is at least self.gcbudget until
+        deadline. Returns the duration of the collection in s (0. if
+        skipped).'''
+        if not self.gcmode or self.clock() + self.gcbudget > deadline:
+            return 0.
+        start = time.time()
+        gc.collect(generation)
+        pause = time.time() - start
+        self.gcpause += pause
+        self.ncollections += 1
+        return pause
+
     def __call__(self):
         '''
         Check for responses and flip the screen. If this is called often
         enough you will achieve sync with the screen refresh (assuming that
         your window method holds until the refresh).'''
         frametime = self.window()
+        if self.frameperiod:
+            if frametime - self.lastframetime > 1.5 * self.frameperiod:
+                self.nframedrops += 1
+            self.lastframetime = frametime
         response, resptime = self.response()
         return response, resptime, frametime
 
+class ResponseMux(object):
+    '''
+    Merge several response devices (e.g. keyboard, button box, scanner
+    trigger) into a single response source for Controller. Each device is
+    polled once per call and the responses are merged in time order, with
+    the device name of each response available in self.lastdevice (and in
+    the device column of the response log, see expcontrol.event.RESPKEYS).
+    Subscriptions (see subscribe) also receive selected keys, e.g. for
+    PulseClock to pick up trigger pulses without polling separately.
+    '''
+
+    def __init__(self, devices, clock=None, pollinterval=.001):
+        '''
+        Initialise a ResponseMux instance.
+
+        Arguments:
+        devices -- dict of response devices keyed by name (or list, in which
+            case the names are list indices). A device is any callable that
+            returns key and time stamp arrays (see
+            expcontrol.psychopydep.KeyboardResponse).
+
+        Keyword arguments:
+        clock=None -- Clock instance used for timeouts and waits in
+            subscriptions (default time.time and time.sleep).
+        pollinterval=.001 -- wait between polls in subscription waitkey.
+        '''
+        if not isinstance(devices, dict):
+            devices = dict(enumerate(devices))
+        self.devices = devices
+        self.clock = clock
+        self.pollinterval = pollinterval
+        self.subscriptions = []
+        self.lastdevice = numpy.array([])
+        # responses collected by subscription polls, returned on next call
+        self.pending = []
+        return
+
+    def poll(self):
+        '''
+        Poll all devices, pass subscribed keys on to subscriptions and add
+        the remaining responses to self.pending.'''
+        allkeys = []
+        alltimes = []
+        alldevices = []
+        for name, device in self.devices.items():
+            keys, times = device()
+            if len(keys):
+                allkeys.append(numpy.asarray(keys))
+                alltimes.append(numpy.asarray(times, dtype=float))
+                alldevices.append(numpy.repeat(name, len(keys)))
+        if not allkeys:
+            return
+        keys = numpy.concatenate(allkeys)
+        times = numpy.concatenate(alltimes)
+        devices = numpy.concatenate(alldevices)
+        order = numpy.argsort(times, kind='mergesort')
+        keys, times, devices = keys[order], times[order], devices[order]
+        for subscription in self.subscriptions:
+            keep = subscription.dispatch(keys, times)
+            keys, times, devices = keys[keep], times[keep], devices[keep]
+        if len(keys):
+            self.pending.append((keys, times, devices))
+        return
+
+    def __call__(self):
+        '''
+        Poll all devices and return key and time stamp arrays sorted by
+        time (subscribed keys excluded).'''
+        self.poll()
+        if not self.pending:
+            self.lastdevice = numpy.array([])
+            return numpy.array([]), numpy.array([])
+        keys, times, devices = [numpy.concatenate(val) for val in
+                                zip(*self.pending)]
+        self.pending = []
+        self.lastdevice = devices
+        return keys, times
+
+    def discard(self, keys, times):
+        '''
+        Remove responses (matched on key and time stamp) from self.pending,
+        so that responses a subscription has already handed out (e.g. the
+        pulse that PulseClock.start waited for) are not returned by __call__
+        later, with time stamps from before any clock reset.'''
+        if not len(keys):
+            return
+        pending = []
+        for thiskeys, thistimes, thisdevices in self.pending:
+            keep = ~(numpy.in1d(thiskeys, keys) &
+                     numpy.in1d(thistimes, times))
+            if numpy.any(keep):
+                pending.append((thiskeys[keep], thistimes[keep],
+                                thisdevices[keep]))
+        self.pending = pending
+        return
+
+    def subscribe(self, keys, consume=False, clearevents=True):
+        '''
+        Return a MuxSubscription that collects responses for keys. If
+        consume, these responses are not returned by __call__, so events
+        never see them. Keep consume=False for trigger keys that SynchEvent
+        (or EventSeqSynchTime) needs to detect pulses.'''
+        subscription = MuxSubscription(self, keys, consume, clearevents)
+        self.subscriptions.append(subscription)
+        return subscription
+
+    def now(self):
+        '''current time for subscription timeouts.'''
+        if self.clock is None:
+            return time.time()
+        return self.clock()
+
+    def wait(self):
+        '''wait self.pollinterval between subscription polls.'''
+        if self.clock is None:
+            time.sleep(self.pollinterval)
+        else:
+            self.clock.wait(self.pollinterval)
+        return
+
+class MuxSubscription(object):
+    '''
+    Responses for a set of keys from a ResponseMux. Has the __call__ and
+    waitkey methods of expcontrol.psychopydep.KeyboardResponse, so it can
+    be passed to PulseClock as keyhand.
+    '''
+
+    def __init__(self, mux, keys, consume=False, clearevents=True):
+        '''
+        Initialise a MuxSubscription instance. Usually created with
+        ResponseMux.subscribe.
+
+        Arguments:
+        mux -- ResponseMux instance.
+        keys -- key or list of keys to collect.
+
+        Keyword arguments:
+        consume=False -- remove these keys from the merged responses (see
+            ResponseMux.subscribe).
+        clearevents=True -- waitkey discards responses that arrived before
+            the call (as psychopy.event.waitKeys).
+        '''
+        self.mux = mux
+        if isinstance(keys, basestring):
+            keys = [keys]
+        self.keys = list(keys)
+        self.consume = consume
+        self.clearevents = clearevents
+        self.bufferkeys = numpy.array([])
+        self.buffertimes = numpy.array([])
+        return
+
+    def dispatch(self, keys, times):
+        '''
+        Buffer the responses that match self.keys and return a boolean
+        array of the responses that should be passed on. Called by the mux.'''
+        match = numpy.in1d(keys, self.keys)
+        if numpy.any(match):
+            self.bufferkeys = numpy.concatenate([self.bufferkeys,
+                                                 keys[match]])
+            self.buffertimes = numpy.concatenate([self.buffertimes,
+                                                  times[match]])
+        if self.consume:
+            return ~match
+        return numpy.ones(match.shape, dtype=bool)
+
+    def flush(self):
+        '''return and clear the buffered responses.'''
+        keys, times = self.bufferkeys, self.buffertimes
+        self.bufferkeys = numpy.array([])
+        self.buffertimes = numpy.array([])
+        return keys, times
+
+    def __call__(self):
+        '''poll the mux and return the responses since the last call.'''
+        self.mux.poll()
+        return self.flush()
+
+    def waitkey(self, dur=float('inf')):
+        '''
+        poll the mux until a response arrives or dur has passed. Responses
+        that are cleared or returned here are removed from the mux's
+        pending responses (see ResponseMux.discard).'''
+        if self.clearevents:
+            self.mux.poll()
+            self.mux.discard(*self.flush())
+        start = self.mux.now()
+        while True:
+            self.mux.poll()
+            if len(self.bufferkeys) or self.mux.now() - start > dur:
+                keys, times = self.flush()
+                self.mux.discard(keys, times)
+                return keys, times
+            self.mux.wait()
+
 class Experiment(object):
     '''
     Class for running a set of trials in some experiment.'''
@@ -89,7 +380,9 @@ class Experiment(object):
             which defines the sequence of conditions over the run.
         seqclass -- class to use for creating the trial sequence. Use
             EventSeqRelTime if absolute timing is not possible (e.g.,
-            self-timed events, synching to pulses).
+            self-timed events), or EventSeqSynchTime to re-anchor absolute
+            timing at SynchEvent pulses. For lag recovery across conditions,
+            use e.g. functools.partial(EventSeqAbsTime, lagpolicy='spread').
 
         Returns:
         eventlog -- pandas DataFrame of events (see expcontrol.event)
@@ -98,33 +391,46 @@ class Experiment(object):
         preresplog -- responses during preevent 
         postevlog -- events during postevent
         postresplog -- responses during postevent
+
+        If controller.frametrace is defined, the frame log of this run for
+        events with frametrace=True is available from
+        controller.frametrace.tolog() (it is not returned here, to keep
+        the return values above unchanged for existing callers).
+
+        The run is wrapped in the controller's context (see
+        Controller.__enter__), with a full collection at the safe point
+        between the preevent and the main sequence.
         '''
-        # unpack to a fixed sequence of conditions
-        # note that we leave name blank so we don't risk overwriting the
-        # condition names in nested EventSeq-derived instances
-        sequence = seqclass([self.conditions[key] for key in conditionkeys],
-                            name=None)
-        # run preevent, zero the clock
-        preevlog = None
-        if self.preevent:
-            preevlog, preresplog = self.preevent(controller, numpy.inf)
-            preevlog['subject'] = self.subject
-            preevlog['session'] = self.session
-            preevlog['context'] = self.context
-        controller.clock.start()
-        # main sequence
-        eventlog, resplog = sequence(controller)
-        # possible post-flight
-        postevlog = None
-        if self.postevent:
-            postevlog, postresplog = self.postevent(controller, numpy.inf)
-            postevlog['subject'] = self.subject
-            postevlog['session'] = self.session
-            postevlog['context'] = self.context
-        eventlog['subject'] = self.subject
-        eventlog['session'] = self.session
-        eventlog['context'] = self.context
-        return eventlog, resplog, preevlog, preresplog, postevlog, postresplog
+        with controller:
+            # unpack to a fixed sequence of conditions
+            # note that we leave name blank so we don't risk overwriting the
+            # condition names in nested EventSeq-derived instances
+            sequence = seqclass([self.conditions[key] for key in conditionkeys],
+                                name=None)
+            # run preevent, zero the clock
+            preevlog = None
+            preresplog = None
+            if self.preevent:
+                preevlog, preresplog = self.preevent(controller, numpy.inf)
+                preevlog['subject'] = self.subject
+                preevlog['session'] = self.session
+                preevlog['context'] = self.context
+            controller.collect()
+            controller.clock.start()
+            # main sequence
+            eventlog, resplog = sequence(controller)
+            # possible post-flight
+            postevlog = None
+            postresplog = None
+            if self.postevent:
+                postevlog, postresplog = self.postevent(controller, numpy.inf)
+                postevlog['subject'] = self.subject
+                postevlog['session'] = self.session
+                postevlog['context'] = self.context
+            eventlog['subject'] = self.subject
+            eventlog['session'] = self.session
+            eventlog['context'] = self.context
+            return eventlog, resplog, preevlog, preresplog, postevlog, postresplog
 
     @addcustomdict
     def to_sql(self, res, path, customdict=None): # pylint: disable=unused-argument
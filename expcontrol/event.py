@@ -1,24 +1,125 @@
 '''Event and event sequence handling for expcontrol.'''
+import gc
 import numpy
-import pandas
+from .lazy import LazyModule
+pandas = LazyModule('pandas')
 
 EVENTKEYS = ['name', 'condition', 'oncall', 'onframe', 'onend']
+# scheduled onset/offset are filled in by EventSeq instances, the deadline
+# (endtime) and actual offset by Event.__call__ (see expcontrol.audit).
+# resynch is the schedule correction at each pulse in EventSeqSynchTime, lag
+# and correction the lag at onset and the part of it taken from the event's
+# slack in EventSeqAbsTime (see lagpolicy).
+TIMINGKEYS = ['scheduledonset', 'scheduledoffset', 'deadline', 'offset',
+              'resynch', 'lag', 'correction']
+# allocations is the net change in tracked (container) objects over the
+# event, gcpause the duration (s) of any safe-point collection at its start
+# (flexible events, see Event.minduration) or after it (see EventSeq and
+# Controller.collect). Both are nan unless the controller's gcmode is set.
+GCKEYS = ['allocations', 'gcpause']
+
+def prepnanframe(columns, ind=None):
+    '''
+    return a pandas DataFrame of nans with columns and indices as in ind.
+    Built from a single array, which is several times faster than building
+    it column by column.
+    '''
+    nrows = 0 if ind is None else len(ind)
+    return pandas.DataFrame(numpy.full((nrows, len(columns)), numpy.nan),
+                            index=ind, columns=columns)
 
 def prepeventrow(ind=None):
     '''
-    return row(s) of the event log with columns as in eventkeys and indices
-    as in ind.
+    return row(s) of the event log with columns as in eventkeys, timingkeys
+    and gckeys and indices as in ind.
     '''
-    return pandas.DataFrame(columns=EVENTKEYS, index=ind, dtype=float)
+    return prepnanframe(EVENTKEYS + TIMINGKEYS + GCKEYS, ind)
 
-RESPKEYS = ['key', 'onresponse_score', 'onresponse_rt']
+# device is the source of each response if the controller's response is an
+# expcontrol.base.ResponseMux (nan otherwise)
+RESPKEYS = ['key', 'onresponse_score', 'onresponse_rt', 'device']
 
 def prepresprow(ind=None):
     '''
     return row(s) of the response log with columns as in respkey and indices
     as in ind.
     '''
-    return pandas.DataFrame(columns=RESPKEYS, index=ind, dtype=float)
+    return prepnanframe(RESPKEYS, ind)
+
+def concatlogs(logs, preplog):
+    '''
+    return the concatenation of the non-empty DataFrames in the list logs,
+    or preplog() if there are none. Empty logs are all float, so leaving
+    them out avoids casting the other columns, which is slow.
+    '''
+    logs = [log for log in logs if len(log)]
+    if not logs:
+        return preplog()
+    return pandas.concat(logs, axis=0)
+
+FRAMEKEYS = ['event', 'name', 'onframe']
+
+class FrameTrace(object):
+    '''
+    Preallocated buffer for frame-by-frame logging of onframe return values
+    and flip time stamps (see the frametrace argument of Event). Attach an
+    instance to the Controller and call tolog after the run to get the
+    frame log. The buffer is cleared as each run starts (see
+    Controller.__enter__).
+    '''
+
+    def __init__(self, size=4096):
+        '''
+        Initialise a FrameTrace instance with room for size frames. The
+        buffer grows as needed.
+        '''
+        self.nframes = 0
+        self.event = numpy.empty(size)
+        self.name = numpy.empty(size, dtype=object)
+        self.onframe = numpy.empty(size, dtype=object)
+        self.frametime = numpy.empty(size)
+        return
+
+    def reserve(self, nframes):
+        '''make sure there is room for another nframes frames.'''
+        size = len(self.frametime)
+        if self.nframes + nframes <= size:
+            return
+        size = max(2 * size, self.nframes + nframes)
+        for key in ('event', 'name', 'onframe', 'frametime'):
+            oldval = getattr(self, key)
+            newval = numpy.empty(size, dtype=oldval.dtype)
+            newval[:self.nframes] = oldval[:self.nframes]
+            setattr(self, key, newval)
+        return
+
+    def clear(self):
+        '''discard all logged frames (the buffer is kept).'''
+        self.nframes = 0
+        return
+
+    def append(self, event, name, onframe, frametime):
+        '''log a single frame. event is the onset of the current event.'''
+        if self.nframes == len(self.frametime):
+            self.reserve(1)
+        self.event[self.nframes] = event
+        self.name[self.nframes] = name
+        self.onframe[self.nframes] = onframe
+        self.frametime[self.nframes] = frametime
+        self.nframes += 1
+        return
+
+    def tolog(self):
+        '''
+        return a pandas DataFrame indexed by flip time with columns as in
+        framekeys. The event column holds the onset (index) of the event in
+        eventlog.
+        '''
+        return pandas.DataFrame({'event': self.event[:self.nframes],
+                                 'name': self.name[:self.nframes],
+                                 'onframe': self.onframe[:self.nframes]},
+                                index=self.frametime[:self.nframes].copy(),
+                                columns=FRAMEKEYS)
 
 class Event(object):
     '''
@@ -28,7 +129,8 @@ class Event(object):
     where only some of these methods may be required.
     '''
 
-    def __init__(self, name=None, duration=0, skiponresponse=[], verbose=False):
+    def __init__(self, name=None, duration=0, skiponresponse=[], verbose=False,
+                 frametrace=False, minduration=None):
         '''
         Initialise an Event instance.
 
@@ -43,10 +145,21 @@ class Event(object):
             with duration=numpy.inf in e.g. Experiment.precondition to
             present instructions until the subject is ready to start.
         verbose=False -- Print to console as we go.
+        frametrace=False -- log the onframe return value and flip time of
+            every frame to controller.frametrace (see FrameTrace). Otherwise
+            only the last onframe return value is kept in the event log.
+        minduration=None -- shortest acceptable duration when lag is
+            recovered in EventSeqAbsTime (see lagpolicy). The difference to
+            duration is the event's slack. Defaults to duration (no slack),
+            so set this for flexible events such as inter-trial intervals.
+            Flexible events are also safe points for garbage collection
+            (see Controller.gcmode).
         '''
         super(Event, self).__init__()
         self.name = name
+        self.frametrace = frametrace
         self.duration = duration
+        self.minduration = duration if minduration is None else minduration
         self.verbose = verbose
         self.skiponresponse = []
         self.setaslist('skiponresponse', skiponresponse)
@@ -82,31 +195,76 @@ class Event(object):
 
         Returns (both indexed by controller.clock()):
         eventlog -- pandas.DataFrame with 1 row. Columns contain the
-            result of each callback (see event.EVENTKEYS).
+            result of each callback (see event.EVENTKEYS) and timing
+            information (see event.TIMINGKEYS).
         resplog -- pandas.Series with one entry per key press.
         '''
-        eventlog = prepeventrow([controller.clock()])
-        eventlog['name'] = self.name
-        eventlog['oncall'] = self.oncall(controller, currentevlog,
-                                         currentresplog)
+        # flexible events are safe points for garbage collection, as long as
+        # the collection leaves minduration before endtime
+        gcpause = 0.
+        if self.minduration < self.duration:
+            gcpause = controller.collect(endtime - self.minduration,
+                                         generation=1)
+        onset = controller.clock()
+        allocstart = gc.get_count()[0]
+        # the log row is collected in a dict and built once at the end,
+        # since setting DataFrame columns one by one is slow
+        row = {'name': self.name, 'deadline': endtime}
+        # message before oncall to keep it close to the logged onset (see
+        # expcontrol.eyelinkasc.alignasc)
         if controller.eyetracker:
             controller.eyetracker.message(self.name)
+        row['oncall'] = self.oncall(controller, currentevlog, currentresplog)
         skipahead = False
-        resplog = prepresprow()
+        # one resplog chunk per frame with responses, concatenated once below
+        responses = []
+        trace = None
+        if self.frametrace and controller.frametrace is not None:
+            trace = controller.frametrace
+            if numpy.isfinite(endtime) and controller.frameperiod:
+                trace.reserve(int(numpy.ceil((endtime - onset) /
+                                             controller.frameperiod)) + 1)
+        onframe = numpy.nan
+        # only count frame drops between flips within this event (not over
+        # catch-up waits and other periods without flips)
+        controller.lastframetime = numpy.inf
         while controller.clock() < endtime and not skipahead:
-            eventlog['onframe'] = self.onframe(controller, currentevlog,
-                                               currentresplog)
+            onframe = self.onframe(controller, currentevlog, currentresplog)
             response, resptime, frametime = controller()
+            if trace is not None:
+                trace.append(onset, self.name, onframe, frametime)
             if len(response):
                 thisresp = prepresprow(ind=resptime)
                 thisresp['key'] = response
+                device = getattr(controller.response, 'lastdevice', None)
+                if device is not None:
+                    thisresp['device'] = device
                 thisresp['onresponse_score'], thisresp['onresponse_rt'] = \
                         self.onresponse(controller, response, resptime,
                                         currentevlog, currentresplog)
-                resplog = pandas.concat([resplog, thisresp], axis=0) # pylint: disable=redefined-variable-type
+                responses.append(thisresp)
                 if numpy.any(numpy.in1d(response, self.skiponresponse)):
                     skipahead = True
-        eventlog['onend'] = self.onend(controller, currentevlog, currentresplog)
+        resplog = concatlogs(responses, prepresprow)
+        # automatic collections reset the count, so this is only logged
+        # with gcmode set on the controller
+        if controller.gcmode:
+            row['allocations'] = gc.get_count()[0] - allocstart
+            row['gcpause'] = gcpause
+        row['onframe'] = onframe
+        row['onend'] = self.onend(controller, currentevlog, currentresplog)
+        if controller.telemetry:
+            controller.telemetry.publish(
+                controller, self.name, endtime, resplog,
+                scored=not isinstance(self, SynchEvent))
+        # after onend, so that time spent there counts as overrun
+        row['offset'] = controller.clock()
+        keys = EVENTKEYS + TIMINGKEYS + GCKEYS
+        eventlog = pandas.DataFrame([[row.get(key, numpy.nan) for key in keys]],
+                                    index=[onset], columns=keys)
+        # condition is set to names by sequences, so keep the dtype stable
+        # for cheaper concatenation with earlier logs
+        eventlog['condition'] = eventlog['condition'].astype(object)
         if self.verbose:
             print eventlog.to_string(header=False)
         return eventlog, resplog
@@ -162,10 +320,54 @@ class EventSeq(Event):
         super(EventSeq, self).__init__(**kwargs)
         self.events = events
         self.eventdur = numpy.array([thisev.duration for thisev in self.events])
-        self.eventskip = [not len(thisev.skiponresponse) for thisev in
-                          self.events]
+        self.eventskip = numpy.array([bool(len(thisev.skiponresponse)) for
+                                      thisev in self.events], dtype=bool)
         return
 
+    def setcondition(self, controller):
+        '''
+        Announce the start of this condition to any live monitoring on the
+        controller. Each named condition counts as a trial. Called at the
+        start of the call method in subclasses.
+        '''
+        if self.name and controller.telemetry:
+            controller.telemetry.newtrial(self.name)
+        if self.name and controller.stats:
+            controller.stats.condition = self.name
+            controller.stats.newtrial()
+        return
+
+    def logschedule(self, evlog, onset, offset):
+        '''
+        Place the event log returned by one of self.events on the schedule of
+        this sequence. Single events get scheduledonset/scheduledoffset
+        directly. Logs from nested sequences already carry a schedule, which
+        is shifted so that it starts at onset (offset is ignored). Use
+        the last scheduledoffset of the returned log as the onset of the
+        next event, since nested sequences without a fixed duration (e.g.
+        EventSeqRelTime) span more than their duration.
+        '''
+        if evlog['scheduledonset'].isnull().all():
+            evlog['scheduledonset'] = onset
+            evlog['scheduledoffset'] = offset
+        else:
+            shift = onset - evlog['scheduledonset'].iloc[0]
+            evlog['scheduledonset'] += shift
+            evlog['scheduledoffset'] += shift
+        return evlog
+
+    @staticmethod
+    def appendlogs(currentevlog, currentresplog, evlog, resplog):
+        '''
+        Return currentevlog and currentresplog with evlog and resplog
+        appended. Empty response logs are skipped, since each concat is
+        costly and most events have no responses.
+        '''
+        currentevlog = pandas.concat([currentevlog, evlog], axis=0)
+        if len(resplog) or currentresplog is None:
+            currentresplog = pandas.concat([currentresplog, resplog], axis=0)
+        return currentevlog, currentresplog
+
     def __call__(self, controller, endtime=0., currentevlog=None, currentresplog=None):
         '''
         do not use. This is for subclass use only.
@@ -176,7 +378,14 @@ class EventSeq(Event):
             # that to happen at the condition level, but not at the experiment
             # level since you'd end up with a single label for all events).
             currentevlog['condition'] = self.name
-        # potential catchup phase
+        # potential catchup phase, which is also a safe point for garbage
+        # collection (charged to the last event). Objects that survive into
+        # the oldest generation are left for the full collection between
+        # runs, which may take longer than the catch-up time.
+        pause = controller.collect(endtime, generation=1)
+        if pause and len(currentevlog):
+            col = currentevlog.columns.get_loc('gcpause')
+            currentevlog.iat[-1, col] = currentevlog.iat[-1, col] + pause
         controller.clock.waituntil(endtime)
         return currentevlog
 
@@ -194,30 +403,65 @@ class EventSeqRelTime(EventSeq):
         return
 
     def __call__(self, controller=None, endtime=0., currentevlog=None, currentresplog=None):
-        outevlog = prepeventrow()
-        outresplog = prepresprow()
+        self.setcondition(controller)
+        # logs are collected in lists and concatenated once at the end
+        outevlogs = []
+        outresplogs = []
+        # nominal onset if every event had lasted exactly its duration
+        # (re-anchored after self-timed events)
+        nominal = numpy.inf
         for ind, thisevent in enumerate(self.events):
             # get time on every trial
             currenttime = controller.clock()
+            if not numpy.isfinite(nominal):
+                nominal = currenttime
             thisevlog, thisresp = thisevent(controller,
                                             currenttime+self.timing[ind],
                                             currentevlog, currentresplog)
+            thisevlog = self.logschedule(thisevlog, nominal,
+                                         nominal+self.timing[ind])
+            if len(thisevlog):
+                nominal = thisevlog['scheduledoffset'].iloc[-1]
             # NB we append the full log, but do not return this to avoid
             # duplicates with nested calls
-            currentevlog = pandas.concat([currentevlog, thisevlog], axis=0)
-            currentresplog = pandas.concat([currentresplog, thisresp], axis=0)
-            outevlog = pandas.concat([outevlog, thisevlog], axis=0)
-            outresplog = pandas.concat([outresplog, thisresp], axis=0)
+            currentevlog, currentresplog = self.appendlogs(
+                currentevlog, currentresplog, thisevlog, thisresp)
+            outevlogs.append(thisevlog)
+            outresplogs.append(thisresp)
             if self.verbose:
                 print '%.1f\t %s' % (currenttime, thisevent.name)
+        outevlog = concatlogs(outevlogs, prepeventrow)
+        outresplog = concatlogs(outresplogs, prepresprow)
         return super(EventSeqRelTime, self).__call__(controller, endtime, outevlog), outresplog
 
+LAGPOLICIES = ['truncate', 'greedy', 'spread']
+
 class EventSeqAbsTime(EventSeq):
     '''
     EventSeq subclass for absolute timings. Given reasonable inputs this
     class will guarantee non-slip time over the course of the run.
+
+    When an event overruns, the next one starts late. How that lag is
+    recovered is set by the lagpolicy keyword argument:
+    truncate -- (default) every event keeps its scheduled end, so the next
+        event is shortened by the full lag.
+    greedy -- lag is taken from the slack (duration minus minduration, see
+        Event) of the next events, as much and as early as possible.
+    spread -- lag is taken from the slack of all remaining events in
+        proportion to their slack, so recovery is spread evenly over the
+        rest of the sequence.
+    With greedy and spread no event is cut below its minduration. Lag that
+    cannot be recovered carries over to the end of the sequence, and a
+    nested sequence keeps to the schedule of its caller so that lag carried
+    into it is recovered from its own events (its default minduration
+    leaves the slack of its events and any extra duration available to the
+    caller). The lag at each event onset and the correction taken from its
+    slack are logged in the lag and correction columns.
     '''
     def __init__(self, *args, **kwargs):
+        self.lagpolicy = kwargs.pop('lagpolicy', 'truncate')
+        assert self.lagpolicy in LAGPOLICIES, \
+                'unknown lagpolicy: ' + str(self.lagpolicy)
         super(EventSeqAbsTime, self).__init__(*args, **kwargs)
         self.timing = numpy.cumsum(self.eventdur)
         realdur = numpy.sum(self.eventdur)
@@ -230,24 +474,144 @@ class EventSeqAbsTime(EventSeq):
                 'event duration cannot exceed condition duration'
         assert not numpy.any(numpy.isinf(self.eventdur) | self.eventskip),\
                 'EventSeqAbsTime is not supported for these events'
+        self.eventslack = numpy.maximum(self.eventdur - numpy.array(
+            [thisev.minduration for thisev in self.events]), 0.)
+        if self.lagpolicy != 'truncate' and kwargs.get('minduration') is None:
+            self.minduration = realdur - numpy.sum(self.eventslack)
         return
 
+    def lagcorrection(self, lag, ind):
+        '''
+        return the part of lag to take from the slack of event ind
+        according to self.lagpolicy. Used internally by __call__.
+        '''
+        if lag <= 0. or self.lagpolicy == 'truncate':
+            # keep the scheduled end
+            return lag
+        if self.lagpolicy == 'greedy':
+            return min(lag, self.eventslack[ind])
+        remaining = numpy.sum(self.eventslack[ind:])
+        if remaining <= 0.:
+            return 0.
+        return min(lag, remaining) * self.eventslack[ind] / remaining
+
     def __call__(self, controller, endtime=0., currentevlog=None, currentresplog=None):
+        self.setcondition(controller)
         starttime = controller.clock()
-        evlog = prepeventrow()
-        resplog = prepresprow()
+        if self.lagpolicy != 'truncate' and 0. < endtime < numpy.inf and \
+                numpy.isfinite(self.duration):
+            # nested call, keep to the caller's schedule
+            starttime = min(starttime, endtime - self.duration)
+        # logs are collected in lists and concatenated once at the end
+        evlogs = []
+        resplogs = []
         endtimes_trial = starttime + self.timing
+        starttimes_trial = endtimes_trial - self.eventdur
         for ind, thisevent in enumerate(self.events):
-            thisevlog, thisresp = thisevent(controller, endtimes_trial[ind],
+            lag = controller.clock() - starttimes_trial[ind]
+            correction = self.lagcorrection(lag, ind)
+            thisevlog, thisresp = thisevent(controller,
+                                            endtimes_trial[ind] + lag -
+                                            correction,
                                             currentevlog, currentresplog)
-            evlog = pandas.concat([evlog, thisevlog], axis=0)
-            resplog = pandas.concat([resplog, thisresp], axis=0)
+            # nested sequences log their own corrections. Other nested logs
+            # get the correction on their first row only, so that it is
+            # counted once when the column is summed
+            if thisevlog['lag'].isnull().all():
+                thisevlog.iat[0, thisevlog.columns.get_loc('lag')] = lag
+                thisevlog.iat[0, thisevlog.columns.get_loc('correction')] = \
+                        correction
+            thisevlog = self.logschedule(thisevlog, starttimes_trial[ind],
+                                         endtimes_trial[ind])
+            evlogs.append(thisevlog)
+            resplogs.append(thisresp)
             # NB we append the full log, but do not return this to avoid
             # duplicates with nested calls
-            currentevlog = pandas.concat([currentevlog, thisevlog], axis=0)
-            currentresplog = pandas.concat([currentresplog, thisresp], axis=0)
+            currentevlog, currentresplog = self.appendlogs(
+                currentevlog, currentresplog, thisevlog, thisresp)
+        evlog = concatlogs(evlogs, prepeventrow)
+        resplog = concatlogs(resplogs, prepresprow)
         return super(EventSeqAbsTime, self).__call__(controller, endtime, evlog), resplog
 
+class EventSeqSynchTime(EventSeq):
+    '''
+    EventSeq subclass for absolute timings that are re-anchored to scanner
+    pulses. Each SynchEvent in the sequence waits for a pulse, and the
+    deadlines of the following events are computed from the detected pulse
+    time. This gives non-slip timing within each block between pulses while
+    preventing lag from building up over the run. The difference between
+    each new anchor and its scheduled time is logged in the resynch column
+    of the SynchEvent row. The anchor is the detected pulse, or the end of
+    the SynchEvent if it timed out without a pulse (in which case the
+    response log has no pulse scored for it).
+    '''
+    def __init__(self, *args, **kwargs):
+        super(EventSeqSynchTime, self).__init__(*args, **kwargs)
+        self.issynch = numpy.array([isinstance(thisev, SynchEvent) for
+                                    thisev in self.events], dtype=bool)
+        # end times relative to the preceding anchor (cumulative sum that
+        # restarts at each SynchEvent)
+        self.timing = numpy.zeros(self.eventdur.shape)
+        elapsed = 0.
+        for ind, thisdur in enumerate(self.eventdur):
+            if self.issynch[ind]:
+                elapsed = 0.
+                self.timing[ind] = thisdur
+            else:
+                elapsed += thisdur
+                self.timing[ind] = elapsed
+        assert not self.duration, \
+            'cannot set EventSeq duration with pulse-synched timings'
+        selftimed = numpy.isinf(self.eventdur) | self.eventskip
+        assert not numpy.any(selftimed & ~self.issynch), \
+                'EventSeqSynchTime only supports self-timed SynchEvents'
+        return
+
+    def __call__(self, controller, endtime=0., currentevlog=None, currentresplog=None):
+        self.setcondition(controller)
+        anchor = controller.clock()
+        # scheduled onset of the current event
+        nominal = anchor
+        # logs are collected in lists and concatenated once at the end
+        evlogs = []
+        resplogs = []
+        for ind, thisevent in enumerate(self.events):
+            if self.issynch[ind]:
+                # duration acts as a timeout
+                thisevlog, thisresp = thisevent(controller,
+                                                controller.clock()+self.timing[ind],
+                                                currentevlog, currentresplog)
+                thisevlog = self.logschedule(thisevlog, nominal,
+                                             nominal+self.timing[ind])
+                pulsetimes = thisresp.index[thisresp['onresponse_score'] == 1]
+                if len(pulsetimes):
+                    anchor = pulsetimes[0]
+                    if self.verbose:
+                        print 'pulse at %.3f\tresynch=%.3f' % \
+                                (anchor, anchor - nominal)
+                else:
+                    # timed out, so carry on from here
+                    anchor = controller.clock()
+                thisevlog['resynch'] = anchor - nominal
+                nominal = anchor
+            else:
+                thisevlog, thisresp = thisevent(controller,
+                                                anchor+self.timing[ind],
+                                                currentevlog, currentresplog)
+                thisevlog = self.logschedule(thisevlog, nominal,
+                                             anchor+self.timing[ind])
+                if len(thisevlog):
+                    nominal = thisevlog['scheduledoffset'].iloc[-1]
+            evlogs.append(thisevlog)
+            resplogs.append(thisresp)
+            # NB we append the full log, but do not return this to avoid
+            # duplicates with nested calls
+            currentevlog, currentresplog = self.appendlogs(
+                currentevlog, currentresplog, thisevlog, thisresp)
+        evlog = concatlogs(evlogs, prepeventrow)
+        resplog = concatlogs(resplogs, prepresprow)
+        return super(EventSeqSynchTime, self).__call__(controller, endtime, evlog), resplog
+
 class DrawEvent(Event):
     '''
     Event sub-class for handling a set of drawinstance, each of which have a
@@ -287,9 +651,25 @@ class FeedbackEvent(DrawEvent):
     '''
 
     def __init__(self, drawinstances, scorer, correctdraw=[], incorrectdraw=[],\
-                 omitdraw=[], **kwargs):
+                 omitdraw=[], usestats=False, **kwargs):
+        '''
+        Initialise a FeedbackEvent instance.
+
+        Arguments:
+        drawinstances -- see DrawEvent. These are drawn on every trial.
+        scorer -- callable that returns 1 (correct), nan (omission) or
+            anything else (incorrect). Called as
+            scorer(currentevlog, currentresplog), or as
+            scorer(controller.stats) if usestats (see expcontrol.stats for
+            examples).
+        correctdraw, incorrectdraw, omitdraw -- additional drawinstances for
+            each scorer outcome.
+        usestats=False -- score from the running statistics in
+            controller.stats rather than the full logs.
+        kwargs -- any additional arguments are passed to Event.'''
         super(FeedbackEvent, self).__init__(drawinstances, **kwargs)
         self.scorer = scorer
+        self.usestats = usestats
         # nb slice to ensure copy
         self.commondraw = []
         self.setaslist('commondraw', self.drawinstances[:])
@@ -304,7 +684,10 @@ class FeedbackEvent(DrawEvent):
     def oncall(self, controller, currentevlog, currentresplog):
         super(FeedbackEvent, self).oncall(controller, currentevlog,
                                           currentresplog)
-        thisscore = self.scorer(currentevlog, currentresplog)
+        if self.usestats:
+            thisscore = self.scorer(controller.stats)
+        else:
+            thisscore = self.scorer(currentevlog, currentresplog)
         # ensure copy
         self.drawinstances = self.commondraw[:]
         if pandas.isnull(thisscore):
@@ -359,6 +742,15 @@ class DetectionEvent(DrawEvent):
         response[antind] = '*'
         return response, rt
 
+    def updatestats(self, controller, score, rt):
+        '''
+        add scored responses to controller.stats (if any). Typically used
+        internally at the end of onresponse callbacks.
+        '''
+        if controller.stats:
+            controller.stats.update(score, rt)
+        return
+
     def onresponse(self, controller, response, resptime, currentevlog, currentresplog):
         '''
         onresponse callback for DetectionEvent. Returns 1 for correct detections
@@ -369,6 +761,7 @@ class DetectionEvent(DrawEvent):
         wascorrect.fill(numpy.nan)
         wascorrect[numpy.in1d(response, self.correct)] = 1
         rt[numpy.isnan(wascorrect)] = numpy.nan
+        self.updatestats(controller, wascorrect, rt)
         return wascorrect, rt
 
 class DecisionEvent(DetectionEvent):
@@ -413,6 +806,7 @@ class DecisionEvent(DetectionEvent):
         wascorrect[numpy.in1d(response, self.incorrect)] = 0
         wascorrect[numpy.in1d(response, self.correct)] = 1
         rt[wascorrect != 1] = numpy.nan
+        self.updatestats(controller, wascorrect, rt)
         if self.verbose:
             print 'correct=%s\tkey=%s' % (wascorrect, response)
         return wascorrect, rt
@@ -471,7 +865,8 @@ class SynchEvent(DetectionEvent):
     '''
     DetectionEvent subclass for synchronising with the scanner. The typical use
     is to drop this instance in toward the end of a trial in a EventSeqRelTime
-    sequence in order to trigger the next trial on the volume pulse.
+    or EventSeqSynchTime sequence in order to trigger the next trial on the
+    volume pulse.
     '''
     def __init__(self, drawinstances, targetkey, duration=numpy.inf, name='synch', **kwargs):
         super(SynchEvent, self).__init__(drawinstances, correct=targetkey,
@@ -0,0 +1,161 @@
+'''
+Parse EyeLink ASC exports (edf2asc) into pandas DataFrames and align them
+to expcontrol event logs. Unlike eyelinkdep this module does not need
+pylink, so it can be used in headless analysis.
+
+The file is read in fixed-size chunks. Non-sample records are pulled out
+of each chunk with multiline regular expressions and everything is parsed
+by the pandas C parser, so there is no per-line Python work and memory use
+is bounded by the chunk size (plus the parsed output).
+'''
+import re
+from cStringIO import StringIO
+import numpy
+from .lazy import LazyModule
+from .align import fitclock
+pandas = LazyModule('pandas')
+
+# anything that is not a sample starts with a letter or '*'
+OTHERPATTERN = re.compile(r'^[A-Za-z*].*\n', re.MULTILINE)
+EVENTPATTERNS = {'fixations': re.compile(r'^EFIX\s+(.*)$', re.MULTILINE),
+                 'saccades': re.compile(r'^ESACC\s+(.*)$', re.MULTILINE),
+                 'blinks': re.compile(r'^EBLINK\s+(.*)$', re.MULTILINE)}
+EVENTCOLUMNS = {'fixations': ['eye', 'start', 'end', 'duration', 'x', 'y',
+                              'pupil'],
+                'saccades': ['eye', 'start', 'end', 'duration', 'startx',
+                             'starty', 'endx', 'endy', 'amplitude',
+                             'peakvelocity'],
+                'blinks': ['eye', 'start', 'end', 'duration']}
+MESSAGEPATTERN = re.compile(r'^MSG\s+(\d+)\s+(.*?)\s*$', re.MULTILINE)
+SAMPLECOLUMNS = {4: ['time', 'x', 'y', 'pupil'],
+                 7: ['time', 'xl', 'yl', 'pupill', 'xr', 'yr', 'pupilr']}
+
+def parselines(text, names):
+    '''
+    Parse whitespace-delimited lines (str or list of str) into a DataFrame
+    with columns names ('.' is read as missing). Any extra trailing fields
+    are ignored.
+    '''
+    if not isinstance(text, str):
+        text = '\n'.join(text)
+    if not text.strip():
+        return pandas.DataFrame(columns=names, dtype=float)
+    return pandas.read_csv(StringIO(text), delim_whitespace=True,
+                           header=None, names=names,
+                           usecols=range(len(names)), na_values=['.'],
+                           engine='c')
+
+def samplecolumns(line):
+    '''column names for samples given the first sample line.'''
+    nnumeric = 0
+    for field in line.split():
+        try:
+            float(field)
+        except ValueError:
+            if field != '.':
+                break
+        nnumeric += 1
+    try:
+        return SAMPLECOLUMNS[nnumeric]
+    except KeyError:
+        return ['time'] + ['c%d' % ind for ind in range(1, nnumeric)]
+
+def iterasc(path, chunksize=2**23):
+    '''
+    Generator that reads the ASC file at path in chunks of about chunksize
+    bytes and yields a dict of DataFrames (samples, fixations, saccades,
+    blinks, messages) for each chunk. Times are in tracker units (ms).
+    '''
+    names = None
+    remainder = ''
+    with open(path, 'rb') as filehand:
+        while True:
+            block = filehand.read(chunksize)
+            if not block and not remainder:
+                break
+            text = remainder + block
+            if block:
+                # hold back the incomplete last line for the next chunk
+                cut = text.rfind('\n') + 1
+                text, remainder = text[:cut], text[cut:]
+            else:
+                remainder = ''
+                # last line of a file without a trailing newline
+                if not text.endswith('\n'):
+                    text += '\n'
+            text = text.replace('\r', '')
+            other = ''.join(OTHERPATTERN.findall(text))
+            text = OTHERPATTERN.sub('', text)
+            if names is None and text.strip():
+                names = samplecolumns(text.lstrip().split('\n', 1)[0])
+            chunk = {'samples': parselines(text, names or ['time'])}
+            for key, pattern in EVENTPATTERNS.items():
+                chunk[key] = parselines(pattern.findall(other),
+                                        EVENTCOLUMNS[key])
+            messages = MESSAGEPATTERN.findall(other)
+            chunk['messages'] = pandas.DataFrame(
+                {'time': numpy.array([int(msg[0]) for msg in messages],
+                                     dtype=float),
+                 'text': [msg[1] for msg in messages]},
+                columns=['time', 'text'])
+            yield chunk
+    return
+
+def readasc(path, chunksize=2**23):
+    '''
+    Read the ASC file at path and return a dict of DataFrames (samples,
+    fixations, saccades, blinks, messages). See iterasc.
+    '''
+    parts = {}
+    for chunk in iterasc(path, chunksize):
+        for key, val in chunk.items():
+            parts.setdefault(key, []).append(val)
+    # skip empty chunks, which may lack sample columns and would upcast
+    # the result to object dtype
+    return dict((key, pandas.concat([part for part in val if len(part)] or
+                                    val[:1], axis=0, ignore_index=True))
+                for key, val in parts.items())
+
+def matchmessages(messages, eventlog):
+    '''
+    Match the event-name messages sent by Event.__call__ to the rows of
+    eventlog, in order. Returns index arrays into messages and eventlog.
+    '''
+    texts = messages['text'].values
+    names = [str(name) for name in eventlog['name'].values]
+    msgind = []
+    evind = []
+    pos = 0
+    for ind, name in enumerate(names):
+        while pos < len(texts) and texts[pos] != name:
+            pos += 1
+        if pos == len(texts):
+            break
+        msgind.append(pos)
+        evind.append(ind)
+        pos += 1
+    return numpy.array(msgind, dtype=int), numpy.array(evind, dtype=int)
+
+def alignasc(data, eventlog, maxresidual=.05):
+    '''
+    Put the output of readasc on the clock of eventlog (see Event.__call__).
+    Event-name messages are matched to eventlog rows and a linear clock
+    mapping is fitted (see fitclock). Returns a new dict where samples and
+    messages have a clocktime column and fixations, saccades and blinks have
+    clockstart and clockend columns (controller.clock units), along with
+    the fitted (slope, intercept).
+    '''
+    msgind, evind = matchmessages(data['messages'], eventlog)
+    slope, intercept = fitclock(data['messages']['time'].values[msgind],
+                                eventlog.index.values.astype(float)[evind],
+                                maxresidual=maxresidual)
+    aligned = {}
+    for key, val in data.items():
+        val = val.copy()
+        if 'time' in val:
+            val['clocktime'] = slope * val['time'].values + intercept
+        if 'start' in val:
+            val['clockstart'] = slope * val['start'].values + intercept
+            val['clockend'] = slope * val['end'].values + intercept
+        aligned[key] = val
+    return aligned, (slope, intercept)
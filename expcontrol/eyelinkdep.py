@@ -2,7 +2,8 @@
 Assumes that their pylink package is on your path.'''
 import time
 import numpy
-import pylink # pylint: disable=import-error
+from .lazy import LazyModule
+pylink = LazyModule('pylink')
 
 class EyeLinkTracker(object):
     '''
@@ -0,0 +1,119 @@
+'''
+Deferred imports for expcontrol. Heavy dependencies (pandas, psychopy,
+pylink) and the expcontrol submodules themselves are bound to LazyModule
+instances, which import the real module on first attribute access. This
+keeps import expcontrol cheap for short sessions and headless analysis.
+
+Run python -m expcontrol.lazy [budget] to check the startup cost: each
+statement in IMPORTCHECKS is timed in a fresh interpreter, and the exit
+status is non-zero if a heavy module was loaded too early or an import
+took longer than budget (s).
+'''
+import sys
+import importlib
+
+def hasmodule(name):
+    '''
+    return True if the module name can be found, without importing it (its
+    parent package is imported).'''
+    try:
+        from importlib.util import find_spec
+    except ImportError:
+        # python 2
+        from pkgutil import find_loader as find_spec
+    return find_spec(name) is not None
+
+class LazyModule(object):
+    '''
+    Stand-in for the module name, which is imported when an attribute is
+    first accessed. Submodules that have not been imported yet are imported
+    on access too (e.g. LazyModule('psychopy').visual).
+    '''
+
+    def __init__(self, name):
+        '''Initialise a LazyModule instance.'''
+        self.__dict__['lazyname'] = name
+        self.__dict__['module'] = None
+        return
+
+    def load(self):
+        '''import the module (if necessary) and return it.'''
+        if self.module is None:
+            self.__dict__['module'] = importlib.import_module(self.lazyname)
+        return self.module
+
+    def __getattr__(self, attr):
+        module = self.load()
+        try:
+            return getattr(module, attr)
+        except AttributeError:
+            name = self.lazyname + '.' + attr
+            if not hasmodule(name):
+                raise AttributeError('%s has no attribute %s' %
+                                     (self.lazyname, attr))
+            # import errors inside an existing submodule are passed on
+            return importlib.import_module(name)
+
+    def __setattr__(self, attr, value):
+        setattr(self.load(), attr, value)
+        return
+
+    def __repr__(self):
+        if self.module is None:
+            return '<lazy module %s (not loaded)>' % self.lazyname
+        return repr(self.module)
+
+# statements to time, and modules that must not be loaded by them
+HEAVYMODULES = ['numpy', 'pandas', 'psychopy', 'pylink']
+IMPORTCHECKS = [('import expcontrol', HEAVYMODULES),
+                ('import expcontrol.base', ['pandas', 'psychopy', 'pylink']),
+                ('import expcontrol.psychopydep', ['pandas', 'psychopy']),
+                ('import expcontrol.simulation', ['pandas', 'psychopy'])]
+
+IMPORTCODE = '''
+import sys, time
+start = time.time()
+%s
+elapsed = time.time() - start
+sys.stdout.write(repr((elapsed, sorted(set(name.split('.')[0]
+                                       for name in sys.modules)))))
+'''
+
+def importcost(statement='import expcontrol', repeat=5):
+    '''
+    Time statement in repeat fresh interpreters (with the current
+    sys.path) and return the fastest time (s) and the list of top-level
+    modules loaded after it.
+    '''
+    # imported here to keep them out of the cost of import expcontrol
+    import ast
+    import subprocess
+    times = []
+    for _ in range(repeat):
+        code = 'import sys; sys.path[:0] = %r\n' % sys.path + \
+                IMPORTCODE % statement
+        elapsed, modules = ast.literal_eval(subprocess.check_output(
+            [sys.executable, '-c', code]))
+        times.append(elapsed)
+    return min(times), modules
+
+def checkimports(budget=.2, repeat=5):
+    '''
+    Run importcost for each of IMPORTCHECKS and print the time and any
+    heavy modules that were loaded. Returns True if no forbidden module was
+    loaded and every import took less than budget.
+    '''
+    passed = True
+    for statement, forbidden in IMPORTCHECKS:
+        elapsed, modules = importcost(statement, repeat)
+        loaded = [name for name in HEAVYMODULES if name in modules]
+        failed = elapsed > budget or bool(set(loaded) & set(forbidden))
+        passed = passed and not failed
+        print '%-35s %6.1f ms  %-30s %s' % (statement, elapsed * 1000.,
+                                             ','.join(loaded) or '-',
+                                             'FAIL' if failed else 'ok')
+    return passed
+
+if __name__ == '__main__':
+    sys.exit(0 if checkimports(*[float(arg) for arg in sys.argv[1:2]])
+             else 1)
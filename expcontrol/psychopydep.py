@@ -1,22 +1,26 @@
 '''Expcontrol functionality that depends on psychopy.'''
 import collections
 import numpy
-import psychopy.core
-import psychopy.visual
-import psychopy.logging
-import psychopy.event
-from psychopy.hardware.emulator import SyncGenerator
+from .lazy import LazyModule
+# psychopy submodules are imported when the class that needs them is built
+psychopy = LazyModule('psychopy')
 
 class Clock(object):
     '''
     Time-keeping functionality for expcontrol by wrapping Psychopy's
     core.Clock instance.'''
 
-    def __init__(self):
-        '''Initialise a clock instance.'''
-        self.ppclock = psychopy.core.Clock()
+    def __init__(self, ppclock=None):
+        '''
+        Initialise a clock instance. ppclock can be any instance with the
+        getTime, reset and add methods of psychopy.core.Clock (e.g.
+        expcontrol.simulation.VirtualTimer). By default a new
+        psychopy.core.Clock is created and used for psychopy logging.'''
+        if ppclock is None:
+            ppclock = psychopy.core.Clock()
+            psychopy.logging.setDefaultClock(ppclock)
+        self.ppclock = ppclock
         super(Clock, self).__init__()
-        psychopy.logging.setDefaultClock(self.ppclock)
         return
 
     def __call__(self):
@@ -50,20 +54,47 @@ class PulseClock(Clock):
     The only further refinement is that the clock will attempt to meausure
     pulse period empirically whenever given a chance (ie, self.waituntil is
     called with enough remaining time that a pulse is expected during the
-    wait. These estimates are stored in self.periodhistory.
+    wait. These estimates are stored in self.periodhistory, and the times of
+    the pulses they are based on in self.pulsehistory.
     '''
     def __init__(self, key, period, pulsedur=0.01, tolerance=.1, timeout=20., \
-                 verbose=False, ndummies=0):
+                 verbose=False, ndummies=0, ppclock=None, keyhand=None):
+        '''
+        Initialise a PulseClock instance.
+
+        Arguments:
+        key -- key that signals a pulse.
+        period -- expected pulse period (s).
+
+        Keyword arguments:
+        pulsedur=0.01 -- wait after each detected pulse to avoid catching the
+            same pulse twice.
+        tolerance=.1 -- maximum deviation of period estimates from the
+            current period before an exception is raised.
+        timeout=20. -- maximum wait for a pulse before an exception is raised.
+        verbose=False -- Print to console as we go.
+        ndummies=0 -- number of pulses to skip in addition to the first one
+            in the start method.
+        ppclock=None -- see Clock.
+        keyhand=None -- pulse source with the waitkey method of
+            KeyboardResponse (default a KeyboardResponse for key). Use
+            ResponseMux.subscribe(key) to share devices with the
+            Controller's response polling (with the default consume=False,
+            so that pulses still reach SynchEvent).
+        '''
         self.period = period
         self.pulsedur = pulsedur
         self.tolerance = tolerance
         self.periodhistory = [period]
+        self.pulsehistory = []
         self.timeout = timeout
         self.verbose = verbose
         assert ndummies >= 0, 'ndummies must be 0 or greater'
         self.ndummies = ndummies
-        super(PulseClock, self).__init__()
-        self.keyhand = KeyboardResponse(key, self.ppclock)
+        super(PulseClock, self).__init__(ppclock)
+        if keyhand is None:
+            keyhand = KeyboardResponse(key, self.ppclock)
+        self.keyhand = keyhand
         return
 
     def waitpulse(self):
@@ -92,6 +123,8 @@ class PulseClock(Clock):
         # same as zeroing the clock - if time has passed since the pulse
         # was received this operation will produce a current clock time >0
         self.ppclock.add(starttime)
+        # pulse times are only meaningful relative to the current start
+        self.pulsehistory = [0.]
         # return current time after all this
         return self()
 
@@ -121,6 +154,7 @@ class PulseClock(Clock):
         if self.verbose:
             print 'Pulse at %.2f. tr=%.3f' % (actualtime, newpulse)
         self.periodhistory.append(newpulse)
+        self.pulsehistory.append(actualtime)
         # avoid catching the same pulse twice
         if (time-self()) > self.pulsedur:
             self.wait(self.pulsedur)
@@ -205,6 +239,7 @@ class PulseEmulator(object):
     def __init__(self, *args, **kwargs):
         '''Initialise a PulseEmulator instance. All arguments are passed to
         SynchGenerator.'''
+        from psychopy.hardware.emulator import SyncGenerator
         self.pulsehand = SyncGenerator(*args, **kwargs)
         return
 
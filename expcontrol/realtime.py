@@ -0,0 +1,274 @@
+'''
+Realtime mode for expcontrol on Linux presentation machines. RealtimeMode is
+a context manager (normally entered through Controller, see
+Controller.__enter__) that raises the scheduling priority or policy of the
+process, pins it to a set of cores and locks its memory to prevent page
+faults, and restores the previous settings on exit.
+
+Each step is attempted separately and its outcome recorded, since most of
+them need privileges (root, CAP_SYS_NICE / CAP_IPC_LOCK, or rtprio, nice
+and memlock limits in /etc/security/limits.conf). Functions in os are used
+where available (Python 3.3+), otherwise the C library is called through
+ctypes.
+
+The effect can be measured with wakeupjitter and framejitter, or with
+python -m expcontrol.realtime [cpu ...], which compares wake-up jitter
+with and without the mode.
+'''
+import os
+import sys
+import time
+import ctypes
+import ctypes.util
+import numpy
+from .lazy import LazyModule
+pandas = LazyModule('pandas')
+
+SCHEDPOLICIES = {'other': 0, 'fifo': 1, 'rr': 2}
+PRIO_PROCESS = 0
+MCL_CURRENT = 1
+MCL_FUTURE = 2
+# bits in the kernel's cpu_set_t
+CPUSETSIZE = 1024
+# the C library, loaded on first use (False if unavailable)
+LIBC = None
+
+class SchedParam(ctypes.Structure):
+    '''struct sched_param for the C library calls.'''
+    _fields_ = [('sched_priority', ctypes.c_int)]
+
+def libccall(name, *args):
+    '''
+    Call the function name in the C library with args and return the
+    result. Raises OSError on failure (as the os module would).
+    '''
+    global LIBC # pylint: disable=global-statement
+    if LIBC is None:
+        path = ctypes.util.find_library('c')
+        try:
+            LIBC = ctypes.CDLL(path, use_errno=True) if path else False
+        except OSError:
+            LIBC = False
+    if not LIBC:
+        raise OSError('C library not available')
+    ctypes.set_errno(0)
+    result = getattr(LIBC, name)(*args)
+    errno = ctypes.get_errno()
+    if result == -1 and errno:
+        raise OSError(errno, '%s: %s' % (name, os.strerror(errno)))
+    return result
+
+def cpumask(cpus=None):
+    '''return a cpu_set_t for the C library with cpus set.'''
+    nbits = 8 * ctypes.sizeof(ctypes.c_ulong)
+    mask = (ctypes.c_ulong * (CPUSETSIZE // nbits))()
+    for cpu in cpus or []:
+        mask[cpu // nbits] |= 1 << (cpu % nbits)
+    return mask
+
+def getpriority():
+    '''return the nice value of this process.'''
+    if hasattr(os, 'getpriority'):
+        return os.getpriority(os.PRIO_PROCESS, 0)
+    return libccall('getpriority', PRIO_PROCESS, 0)
+
+def setpriority(nice):
+    '''set the nice value of this process (negative values need
+    privileges).'''
+    if hasattr(os, 'setpriority'):
+        os.setpriority(os.PRIO_PROCESS, 0, nice)
+    else:
+        libccall('setpriority', PRIO_PROCESS, 0, nice)
+    return
+
+def getscheduler():
+    '''return the scheduling policy and realtime priority of this
+    process.'''
+    if hasattr(os, 'sched_getscheduler'):
+        return os.sched_getscheduler(0), os.sched_getparam(0).sched_priority
+    param = SchedParam()
+    libccall('sched_getparam', 0, ctypes.byref(param))
+    return libccall('sched_getscheduler', 0), param.sched_priority
+
+def setscheduler(scheduler):
+    '''set the scheduling policy and realtime priority of this process from
+    a (policy, priority) tuple (see SCHEDPOLICIES).'''
+    policy, priority = scheduler
+    if hasattr(os, 'sched_setscheduler'):
+        os.sched_setscheduler(0, policy, os.sched_param(priority))
+    else:
+        libccall('sched_setscheduler', 0, policy,
+                 ctypes.byref(SchedParam(priority)))
+    return
+
+def getaffinity():
+    '''return the set of cores this process may run on.'''
+    if hasattr(os, 'sched_getaffinity'):
+        return set(os.sched_getaffinity(0))
+    mask = cpumask()
+    libccall('sched_getaffinity', 0, ctypes.sizeof(mask), ctypes.byref(mask))
+    nbits = 8 * ctypes.sizeof(ctypes.c_ulong)
+    return set(cpu for cpu in range(CPUSETSIZE)
+               if mask[cpu // nbits] >> (cpu % nbits) & 1)
+
+def setaffinity(cpus):
+    '''restrict this process to the cores in cpus.'''
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpus)
+    else:
+        mask = cpumask(cpus)
+        libccall('sched_setaffinity', 0, ctypes.sizeof(mask),
+                 ctypes.byref(mask))
+    return
+
+def setmemorylock(lock):
+    '''lock all current and future pages of this process in memory (or
+    unlock them if not lock).'''
+    if lock:
+        libccall('mlockall', MCL_CURRENT | MCL_FUTURE)
+    else:
+        libccall('munlockall')
+    return
+
+class RealtimeMode(object):
+    '''
+    Context manager that puts the process in realtime mode on entry and
+    restores the previous settings on exit. Steps that fail (usually for
+    lack of privileges) are skipped and recorded in self.status (True if
+    applied) and self.errors, so the experiment runs either way.
+    '''
+
+    def __init__(self, nice=-10, policy=None, rtpriority=10, cpus=None,
+                 lock=True, verbose=True):
+        '''
+        Initialise a RealtimeMode instance.
+
+        Keyword arguments:
+        nice=-10 -- nice value (-20 to 19, lower is higher priority). None
+            to leave unchanged.
+        policy=None -- scheduling policy ('fifo', 'rr' or 'other', see
+            SCHEDPOLICIES). Note that a realtime policy can starve other
+            processes (including the display server) if the experiment
+            busy-waits, so make sure the frame loop blocks on the flip.
+        rtpriority=10 -- realtime priority (1-99) for 'fifo' and 'rr'.
+        cpus=None -- list of cores to pin the process to (e.g. cores
+            isolated with the isolcpus kernel parameter).
+        lock=True -- lock current and future memory pages (mlockall). The
+            process must fit within the memlock limit.
+        verbose=True -- print the outcome of each step on entry.
+        '''
+        assert policy is None or policy in SCHEDPOLICIES, \
+                'unknown policy: ' + str(policy)
+        self.nice = nice
+        self.policy = policy
+        self.rtpriority = rtpriority if policy in ('fifo', 'rr') else 0
+        self.cpus = cpus
+        self.lock = lock
+        self.verbose = verbose
+        self.status = {}
+        self.errors = {}
+        self.previous = {}
+        return
+
+    def steps(self):
+        '''
+        return a list of (name, getter, setter, value) for the steps
+        requested on init, in the order they are applied.
+        '''
+        steps = []
+        if self.nice is not None:
+            steps.append(('nice', getpriority, setpriority, self.nice))
+        if self.policy is not None:
+            steps.append(('policy', getscheduler, setscheduler,
+                          (SCHEDPOLICIES[self.policy], self.rtpriority)))
+        if self.cpus is not None:
+            steps.append(('affinity', getaffinity, setaffinity,
+                          set(self.cpus)))
+        if self.lock:
+            # there is no call to query mlockall, so assume unlocked
+            steps.append(('memory', lambda: False, setmemorylock, True))
+        return steps
+
+    def __enter__(self):
+        '''apply each step, recording the previous settings.'''
+        self.status = {}
+        self.errors = {}
+        self.previous = {}
+        for name, getter, setter, value in self.steps():
+            try:
+                self.previous[name] = getter()
+                setter(value)
+            except (OSError, ValueError) as err:
+                self.status[name] = False
+                self.errors[name] = str(err)
+            else:
+                self.status[name] = True
+        if self.verbose:
+            print self.report()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        '''restore the previous settings in reverse order.'''
+        for name, _, setter, _ in reversed(self.steps()):
+            if not self.status.get(name):
+                continue
+            try:
+                setter(self.previous[name])
+            except (OSError, ValueError) as err:
+                self.errors[name] = 'restore failed: ' + str(err)
+        return False
+
+    def report(self):
+        '''return a one-line summary of the outcome of each step.'''
+        return 'realtime mode: ' + ', '.join(
+            '%s %s' % (name, 'ok' if self.status[name] else
+                       'failed (%s)' % self.errors[name])
+            for name, _, _, _ in self.steps())
+
+def wakeupjitter(interval=.001, n=1000):
+    '''
+    Sleep for interval (s) n times and return the wake-up latency of each
+    sleep (actual minus requested duration), a measure of how promptly the
+    scheduler returns control to the process.
+    '''
+    latency = numpy.empty(n)
+    for ind in range(n):
+        start = time.time()
+        time.sleep(interval)
+        latency[ind] = time.time() - start - interval
+    return latency
+
+def framejitter(frametimes, frameperiod):
+    '''
+    return the deviation of each inter-flip interval from frameperiod, e.g.
+    for the index of controller.frametrace.tolog() (see
+    expcontrol.event.FrameTrace). Only use flips within an event, since the
+    gaps between events include event set-up.
+    '''
+    return numpy.diff(numpy.asarray(frametimes, dtype=float)) - frameperiod
+
+def jittersummary(jitter):
+    '''return a pandas Series with the n, mean, sd, 99th percentile and max
+    of jitter (output from wakeupjitter or framejitter).'''
+    jitter = numpy.asarray(jitter, dtype=float)
+    return pandas.Series([len(jitter), numpy.mean(jitter), numpy.std(jitter),
+                          numpy.percentile(jitter, 99), numpy.max(jitter)],
+                         index=['n', 'mean', 'sd', 'p99', 'max'])
+
+def comparejitter(mode=None, interval=.001, n=1000):
+    '''
+    Measure wake-up jitter (see wakeupjitter) with and without realtime
+    mode (a RealtimeMode instance, default settings if None) and return a
+    pandas DataFrame with a summary column for each (see jittersummary).
+    '''
+    if mode is None:
+        mode = RealtimeMode()
+    normal = jittersummary(wakeupjitter(interval, n))
+    with mode:
+        realtime = jittersummary(wakeupjitter(interval, n))
+    return pandas.DataFrame({'normal': normal, 'realtime': realtime},
+                            columns=['normal', 'realtime'])
+
+if __name__ == '__main__':
+    print comparejitter(RealtimeMode(cpus=[int(arg) for arg in sys.argv[1:]]
+                                     or None))
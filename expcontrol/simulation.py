@@ -0,0 +1,412 @@
+'''
+Deterministic simulation for expcontrol. Time is kept by a VirtualTimer
+that only advances when something waits or the screen flips, so PulseClock
+logic can be exercised with thousands of simulated scans in seconds (with
+configurable pulse jitter, dropout and duplication), and recorded sessions
+can be replayed through Experiment.__call__ much faster than real time.
+'''
+import numpy
+from .lazy import LazyModule
+from . import psychopydep
+from .base import Controller
+pandas = LazyModule('pandas')
+
+class VirtualTimer(object):
+    '''
+    Stand-in for psychopy.core.Clock where time only advances when advance
+    is called. Absolute time (self.abstime) starts at 0 on construction.
+    '''
+
+    def __init__(self):
+        '''Initialise a VirtualTimer instance.'''
+        self.abstime = 0.
+        self.zero = 0.
+        self.nresets = 0
+        return
+
+    def getTime(self): # pylint: disable=invalid-name
+        '''time since the last reset (as psychopy.core.Clock.getTime).'''
+        return self.abstime - self.zero
+
+    def reset(self):
+        '''set the current time to 0.'''
+        self.zero = self.abstime
+        self.nresets += 1
+        return
+
+    def add(self, time):
+        '''shift the zero point forward (as psychopy.core.Clock.add).'''
+        self.zero += time
+        return
+
+    def advance(self, time):
+        '''move time forward by time (negative values are ignored).'''
+        self.abstime += max(time, 0.)
+        return
+
+class PulseSource(object):
+    '''
+    Simulated trigger pulses on a VirtualTimer. Pulse times are generated up
+    front, and the instance has the __call__ and waitkey methods of
+    expcontrol.psychopydep.KeyboardResponse so it can stand in for keyboard
+    polling in PulseClock (keyhand) or Controller (response).
+    '''
+
+    def __init__(self, timer, period=2., jitter=0., dropout=0.,
+                 duplication=0., dupdelay=.02, onset=None, npulses=1000,
+                 key='5', seed=None, pulsetimes=None, clearevents=True,
+                 latency=.001):
+        '''
+        Initialise a PulseSource instance.
+
+        Arguments:
+        timer -- VirtualTimer instance.
+
+        Keyword arguments:
+        period=2. -- true pulse period (s).
+        jitter=0. -- standard deviation of gaussian jitter on each pulse (s).
+        dropout=0. -- probability that a pulse is missed.
+        duplication=0. -- probability that a pulse is registered twice.
+        dupdelay=.02 -- delay of duplicated pulses (s).
+        onset=None -- absolute time of the first pulse (default: uniform
+            random within the first period).
+        npulses=1000 -- number of pulses to generate.
+        key='5' -- key returned for each pulse.
+        seed=None -- seed for numpy.random.RandomState.
+        pulsetimes=None -- use these absolute pulse times instead of
+            generating them (e.g. to replay a recorded scan).
+        clearevents=True -- waitkey discards pulses that arrived before the
+            call (as psychopy.event.waitKeys).
+        latency=.001 -- time between a pulse and waitkey returning it.
+        '''
+        self.timer = timer
+        self.key = key
+        self.clearevents = clearevents
+        self.latency = latency
+        if pulsetimes is None:
+            rng = numpy.random.RandomState(seed)
+            if onset is None:
+                onset = rng.uniform(0., period)
+            pulsetimes = onset + period * numpy.arange(npulses) + \
+                    rng.normal(0., jitter, npulses)
+            pulsetimes = pulsetimes[rng.uniform(size=npulses) >= dropout]
+            dups = pulsetimes[rng.uniform(size=len(pulsetimes)) < duplication]
+            pulsetimes = numpy.concatenate([pulsetimes, dups + dupdelay])
+        self.pulsetimes = numpy.sort(numpy.asarray(pulsetimes, dtype=float))
+        # index of the next pulse that has not been returned yet
+        self.nextpulse = 0
+        return
+
+    def pending(self):
+        '''index of the first pulse that is still in the future.'''
+        return numpy.searchsorted(self.pulsetimes, self.timer.abstime,
+                                  side='right')
+
+    def returnpulses(self, stop):
+        '''return key and time arrays for pulses up to index stop, in timer
+        units. Used internally.'''
+        times = self.pulsetimes[self.nextpulse:stop] - self.timer.zero
+        self.nextpulse = max(stop, self.nextpulse)
+        return numpy.array([self.key] * len(times)), times
+
+    def __call__(self):
+        '''return pulses since the last call.'''
+        return self.returnpulses(self.pending())
+
+    def waitkey(self, dur=float('inf')):
+        '''advance the timer to the next pulse, or by dur if no pulse arrives
+        within dur.'''
+        stop = self.pending()
+        if self.clearevents:
+            self.nextpulse = max(stop, self.nextpulse)
+        elif stop > self.nextpulse:
+            return self.returnpulses(stop)
+        if self.nextpulse >= len(self.pulsetimes) or \
+                self.pulsetimes[self.nextpulse] - self.timer.abstime > dur:
+            self.timer.advance(dur)
+            return numpy.array([]), numpy.array([])
+        self.timer.advance(self.pulsetimes[self.nextpulse] + self.latency -
+                           self.timer.abstime)
+        return self.returnpulses(self.pending())
+
+class VirtualClock(psychopydep.Clock):
+    '''
+    expcontrol.psychopydep.Clock running on a VirtualTimer.
+    '''
+
+    def __init__(self, timer=None):
+        '''Initialise a VirtualClock instance (new VirtualTimer by
+        default).'''
+        if timer is None:
+            timer = VirtualTimer()
+        super(VirtualClock, self).__init__(ppclock=timer)
+        return
+
+    def wait(self, time):
+        '''advance virtual time by time duration (s).'''
+        self.ppclock.advance(time)
+        return
+
+class VirtualPulseClock(psychopydep.PulseClock):
+    '''
+    expcontrol.psychopydep.PulseClock running on a VirtualTimer, with pulses
+    from a PulseSource.
+    '''
+
+    def __init__(self, period, source=None, timer=None, **kwargs):
+        '''
+        Initialise a VirtualPulseClock instance.
+
+        Arguments:
+        period -- expected pulse period (s), as for PulseClock.
+
+        Keyword arguments:
+        source -- dict of keyword arguments for PulseSource (the true period
+            defaults to period).
+        timer -- VirtualTimer instance (default new instance).
+        kwargs -- any additional arguments are passed to PulseClock.
+        '''
+        if timer is None:
+            timer = VirtualTimer()
+        sourceargs = {'period': period}
+        if source:
+            sourceargs.update(source)
+        keyhand = PulseSource(timer, **sourceargs)
+        super(VirtualPulseClock, self).__init__(keyhand.key, period,
+                                                ppclock=timer,
+                                                keyhand=keyhand, **kwargs)
+        return
+
+    def wait(self, time):
+        '''advance virtual time by time duration (s).'''
+        self.ppclock.advance(time)
+        return
+
+class ReplayWindow(object):
+    '''
+    Stand-in for expcontrol.psychopydep.Window that advances a VirtualTimer
+    by one frame per flip.
+    '''
+
+    def __init__(self, timer, frameperiod=1/60.):
+        '''Initialise a ReplayWindow instance.'''
+        self.timer = timer
+        self.frameperiod = frameperiod
+        return
+
+    def __call__(self):
+        '''advance one frame and return the flip time.'''
+        self.timer.advance(self.frameperiod)
+        return self.timer.getTime()
+
+class ReplayResponse(object):
+    '''
+    Return recorded responses at their original time stamps as virtual time
+    passes. Responses are given per clock phase: phase 0 runs until the
+    first clock start (pre-event), phase 1 after it (main sequence and
+    post-event).
+    '''
+
+    def __init__(self, timer, phases):
+        '''
+        Initialise a ReplayResponse instance.
+
+        Arguments:
+        timer -- VirtualTimer instance.
+        phases -- list of (keys, times) tuples, one per phase, with times in
+            clock units for that phase.
+        '''
+        self.timer = timer
+        self.phases = []
+        for keys, times in phases:
+            times = numpy.asarray(times, dtype=float)
+            order = numpy.argsort(times, kind='mergesort')
+            self.phases.append((numpy.asarray(keys)[order], times[order]))
+        self.phase = 0
+        self.nextresp = 0
+        return
+
+    def __call__(self):
+        '''return the recorded responses up to the current time.'''
+        phase = min(self.timer.nresets, len(self.phases)-1)
+        if phase != self.phase:
+            self.phase = phase
+            self.nextresp = 0
+        keys, times = self.phases[self.phase]
+        stop = max(self.nextresp, numpy.searchsorted(
+            times, self.timer.getTime(), side='right'))
+        start, self.nextresp = self.nextresp, stop
+        return keys[start:stop], times[start:stop].copy()
+
+class ReplayController(Controller):
+    '''
+    Controller that replays a recorded session on virtual time: the window
+    advances one frame per flip, waits return immediately and the recorded
+    responses are returned at their original time stamps. Pulses can be
+    replayed as key presses (e.g. for SynchEvent), but PulseClock waits are
+    not emulated.
+    '''
+
+    def __init__(self, resplog, preresplog=None, postresplog=None,
+                 pulsetimes=None, pulsekey='5', frameperiod=1/60., **kwargs):
+        '''
+        Initialise a ReplayController instance.
+
+        Arguments:
+        resplog -- response log from the main sequence (see
+            Experiment.__call__).
+
+        Keyword arguments:
+        preresplog -- response log from the pre-event.
+        postresplog -- response log from the post-event.
+        pulsetimes -- pulse times to add to the main sequence responses as
+            pulsekey presses (e.g. PulseClock.pulsehistory).
+        frameperiod=1/60. -- duration of each simulated frame. Longer
+            periods replay faster, but coarsen event timing (response time
+            stamps are always replayed exactly).
+        kwargs -- any additional arguments are passed to Controller.
+        '''
+        timer = VirtualTimer()
+        phases = []
+        for phaselogs in ([preresplog], [resplog, postresplog]):
+            keys = [log['key'].values for log in phaselogs if log is not None]
+            times = [log.index.values for log in phaselogs if log is not None]
+            phases.append((numpy.concatenate(keys or [[]]),
+                           numpy.concatenate(times or [[]])))
+        if pulsetimes is not None:
+            phases[1] = (numpy.concatenate([phases[1][0],
+                                            [pulsekey] * len(pulsetimes)]),
+                         numpy.concatenate([phases[1][1], pulsetimes]))
+        kwargs.setdefault('frameperiod', frameperiod)
+        super(ReplayController, self).__init__(
+            window=ReplayWindow(timer, frameperiod),
+            response=ReplayResponse(timer, phases),
+            clock=VirtualClock(timer), **kwargs)
+        return
+
+def replay(experiment, conditionkeys, resplog, preresplog=None,
+           postresplog=None, pulsetimes=None, eventlog=None, postdelay=1.,
+           **kwargs):
+    '''
+    Replay a recorded session through experiment (an Experiment instance)
+    and return the new logs as in Experiment.__call__.
+
+    If the pre- or post-event ends on a response and no log is provided for
+    it, its first skiponresponse key is injected at the start of the
+    pre-event, or postdelay after the end of the main sequence. The end is
+    taken as the latest of the recorded responses, the nominal duration of
+    the conditions and the event offsets in eventlog (if provided), so for
+    sequences that may run over their nominal duration (e.g.
+    EventSeqRelTime) eventlog or postresplog should be provided.
+    Remaining keyword arguments are passed to ReplayController, except
+    seqclass, which is passed to Experiment.__call__.
+
+    Replay speed is limited by building the pandas logs, which the event
+    callbacks receive as DataFrames: roughly 9 ms per event (pandas 0.24),
+    plus a small cost per event that grows with the length of the running
+    log. A 1 h session of 1800 two-event trials replays in about 35 s at
+    the default frameperiod, so this is a tool for checking a session
+    before running it rather than for fitting many simulated sessions.
+    '''
+    seqkwargs = {}
+    if 'seqclass' in kwargs:
+        seqkwargs['seqclass'] = kwargs.pop('seqclass')
+    if preresplog is None and experiment.preevent and \
+            experiment.preevent.skiponresponse:
+        preresplog = pandas.DataFrame(
+            {'key': experiment.preevent.skiponresponse[:1]}, index=[0.])
+    if postresplog is None and experiment.postevent and \
+            experiment.postevent.skiponresponse:
+        durations = numpy.array([experiment.conditions[key].duration for key
+                                 in conditionkeys], dtype=float)
+        endtimes = [resplog.index.values,
+                    [numpy.sum(durations[numpy.isfinite(durations)])]]
+        if eventlog is not None:
+            endtimes += [eventlog.index.values, eventlog['offset'].values]
+        endtime = numpy.nanmax(numpy.concatenate(endtimes).astype(float))
+        postresplog = pandas.DataFrame(
+            {'key': experiment.postevent.skiponresponse[:1]},
+            index=[endtime + postdelay])
+    controller = ReplayController(resplog, preresplog=preresplog,
+                                  postresplog=postresplog,
+                                  pulsetimes=pulsetimes, **kwargs)
+    return experiment(controller, conditionkeys, **seqkwargs)
+
+def comparelogs(original, replayed, columns):
+    '''
+    Compare columns of two logs row by row (e.g. eventlogs from the original
+    session and a replay) and return the rows that differ, with the original
+    and replayed values side by side. Nans compare equal.
+    '''
+    assert len(original) == len(replayed), 'logs differ in length'
+    old = original[columns].reset_index(drop=True)
+    new = replayed[columns].reset_index(drop=True)
+    differ = ~((old == new) | (old.isnull() & new.isnull()))
+    rows = differ.any(axis=1).values
+    return pandas.concat([old[rows], new[rows]], axis=1,
+                         keys=['original', 'replayed'])
+
+def simulatescan(clock, waittimes):
+    '''
+    Start clock and call waituntil for each of waittimes. Returns a dict with
+    the outcome ('ok', 'timeout' or 'tolerance'), the number of completed
+    waits, the number of period estimates and the final period estimate.
+    '''
+    outcome = 'ok'
+    nwaits = 0
+    try:
+        clock.start()
+        for thistime in waittimes:
+            clock.waituntil(thistime)
+            nwaits += 1
+    except AssertionError:
+        outcome = 'timeout'
+    except Exception as err: # pylint: disable=broad-except
+        if 'tolerance' not in str(err):
+            raise
+        outcome = 'tolerance'
+    return {'outcome': outcome, 'nwaits': nwaits,
+            'nestimates': len(clock.periodhistory)-1,
+            'period': clock.period}
+
+def stresstest(nscans=1000, period=2., trueperiod=None, nwaits=20,
+               waitspacing=None, seed=0, source=None, **kwargs):
+    '''
+    Run nscans simulated scans through VirtualPulseClock and return a pandas
+    DataFrame with one row per scan (see simulatescan) and the period
+    estimate error relative to trueperiod.
+
+    Keyword arguments:
+    nscans=1000 -- number of simulated scans.
+    period=2. -- period given to PulseClock.
+    trueperiod=None -- actual period of the pulses (default period).
+    nwaits=20 -- number of waituntil calls per scan.
+    waitspacing=None -- mean interval between waituntil targets (default
+        1.5*period). Intervals are drawn from an exponential distribution.
+    seed=0 -- seeds are seed, seed+1, ... for successive scans.
+    source -- dict of additional keyword arguments for PulseSource (e.g.
+        jitter, dropout, duplication).
+    kwargs -- any additional arguments are passed to PulseClock (e.g.
+        tolerance, timeout, ndummies).
+    '''
+    if trueperiod is None:
+        trueperiod = period
+    if waitspacing is None:
+        waitspacing = 1.5 * period
+    rng = numpy.random.RandomState(seed)
+    waittimes = numpy.cumsum(rng.exponential(waitspacing, (nscans, nwaits)),
+                             axis=1)
+    npulses = int(numpy.ceil(waittimes.max() / trueperiod)) + \
+            kwargs.get('ndummies', 0) + 10
+    results = []
+    for scan in range(nscans):
+        sourceargs = {'period': trueperiod, 'seed': seed + scan,
+                      'npulses': npulses}
+        if source:
+            sourceargs.update(source)
+        clock = VirtualPulseClock(period, source=sourceargs, **kwargs)
+        results.append(simulatescan(clock, waittimes[scan]))
+    results = pandas.DataFrame(results, columns=['outcome', 'nwaits',
+                                                 'nestimates', 'period'])
+    results['perioderror'] = results['period'] - trueperiod
+    return results
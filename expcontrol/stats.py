@@ -0,0 +1,225 @@
+'''
+Incremental response statistics for expcontrol. A RunningStats instance
+attached to the Controller is updated as responses are scored in
+DetectionEvent/DecisionEvent.onresponse, so that scorers (see
+FeedbackEvent) can read accuracy and RT summaries in constant time instead of
+rescanning the full event and response logs.
+'''
+import collections
+import numpy
+from .lazy import LazyModule
+pandas = LazyModule('pandas')
+
+class ConditionStats(object):
+    '''
+    Streaming summary of scored responses: counts, accuracy, RT
+    mean/variance (Welford), an RT histogram for approximate quantiles and
+    a sliding window over the most recent responses.
+    '''
+
+    def __init__(self, window=10, rtbins=numpy.linspace(0., 3., 301)):
+        '''
+        Initialise a ConditionStats instance.
+
+        Keyword arguments:
+        window -- number of recent scored responses in the sliding window.
+        rtbins -- bin edges for the RT histogram that supports quantile
+            estimates. RTs outside the range are clipped to the outer bins.
+        '''
+        self.rtbins = numpy.asarray(rtbins, dtype=float)
+        self.rtcounts = numpy.zeros(len(self.rtbins)-1, dtype=int)
+        self.nscored = 0
+        self.ncorrect = 0
+        self.nrt = 0
+        self.rtmean = numpy.nan
+        self.rtm2 = 0.
+        self.recentscore = collections.deque(maxlen=window)
+        self.recentrt = collections.deque(maxlen=window)
+        self.windowscoresum = 0.
+        self.windowrtsum = 0.
+        self.windowrtn = 0
+        # score of the last response in the current trial (see newtrial)
+        self.lastscore = numpy.nan
+        return
+
+    def newtrial(self):
+        '''start a new trial (lastscore is nan until a response is
+        scored).'''
+        self.lastscore = numpy.nan
+        return
+
+    def update(self, scores, rts):
+        '''
+        Add scored responses. scores and rts are arrays as returned by the
+        onresponse callbacks (nan for unscored responses and missing RTs).
+        '''
+        scores = numpy.asarray(scores, dtype=float)
+        rts = numpy.asarray(rts, dtype=float)
+        scored = ~numpy.isnan(scores)
+        if not numpy.any(scored):
+            return
+        scores = scores[scored]
+        rts = rts[scored]
+        self.nscored += len(scores)
+        self.ncorrect += int(numpy.sum(scores == 1))
+        self.lastscore = scores[-1]
+        validrt = rts[~numpy.isnan(rts)]
+        if len(validrt):
+            # batch version of Welford's update (Chan et al.)
+            nbatch = len(validrt)
+            batchmean = numpy.mean(validrt)
+            batchm2 = numpy.sum((validrt - batchmean)**2)
+            ntotal = self.nrt + nbatch
+            if self.nrt:
+                delta = batchmean - self.rtmean
+                self.rtmean += delta * nbatch / float(ntotal)
+                self.rtm2 += batchm2 + delta**2 * self.nrt * nbatch / \
+                        float(ntotal)
+            else:
+                self.rtmean = batchmean
+                self.rtm2 = batchm2
+            self.nrt = ntotal
+            binind = numpy.clip(numpy.searchsorted(self.rtbins, validrt,
+                                                   side='right')-1,
+                                0, len(self.rtcounts)-1)
+            numpy.add.at(self.rtcounts, binind, 1)
+        for thisscore, thisrt in zip(scores, rts):
+            if len(self.recentscore) == self.recentscore.maxlen:
+                self.windowscoresum -= self.recentscore[0]
+                if not numpy.isnan(self.recentrt[0]):
+                    self.windowrtsum -= self.recentrt[0]
+                    self.windowrtn -= 1
+            self.recentscore.append(thisscore)
+            self.recentrt.append(thisrt)
+            self.windowscoresum += thisscore
+            if not numpy.isnan(thisrt):
+                self.windowrtsum += thisrt
+                self.windowrtn += 1
+        return
+
+    @property
+    def accuracy(self):
+        '''proportion of scored responses that were correct.'''
+        if not self.nscored:
+            return numpy.nan
+        return self.ncorrect / float(self.nscored)
+
+    @property
+    def rtvar(self):
+        '''sample variance of valid RTs.'''
+        if self.nrt < 2:
+            return numpy.nan
+        return self.rtm2 / (self.nrt - 1.)
+
+    @property
+    def windowaccuracy(self):
+        '''accuracy over the sliding window.'''
+        if not len(self.recentscore):
+            return numpy.nan
+        return self.windowscoresum / len(self.recentscore)
+
+    @property
+    def windowrtmean(self):
+        '''mean RT over the sliding window.'''
+        if not self.windowrtn:
+            return numpy.nan
+        return self.windowrtsum / self.windowrtn
+
+    def rtquantile(self, q):
+        '''
+        approximate RT quantile(s) q (0-1) from the histogram, with linear
+        interpolation within bins.
+        '''
+        if not self.nrt:
+            return numpy.nan * numpy.asarray(q, dtype=float)
+        cumcounts = numpy.concatenate([[0], numpy.cumsum(self.rtcounts)])
+        return numpy.interp(numpy.asarray(q) * cumcounts[-1], cumcounts,
+                            self.rtbins)
+
+    def summary(self):
+        '''return a dict of the current summary statistics.'''
+        return {'nscored': self.nscored, 'ncorrect': self.ncorrect,
+                'accuracy': self.accuracy, 'rtmean': self.rtmean,
+                'rtvar': self.rtvar, 'rtmedian': self.rtquantile(.5),
+                'windowaccuracy': self.windowaccuracy,
+                'windowrtmean': self.windowrtmean}
+
+class RunningStats(object):
+    '''
+    Per-condition ConditionStats, kept up to date from the onresponse
+    callbacks of DetectionEvent and its subclasses. The current condition is
+    set by EventSeq instances as they are called (see EventSeq.setcondition).
+    '''
+
+    def __init__(self, **kwargs):
+        '''
+        Initialise a RunningStats instance. Any keyword arguments are passed
+        to ConditionStats.
+        '''
+        self.statkwargs = kwargs
+        self.condition = None
+        self.total = ConditionStats(**kwargs)
+        self.conditions = {}
+        return
+
+    def __getitem__(self, condition):
+        '''return the ConditionStats for condition (created if necessary).'''
+        try:
+            return self.conditions[condition]
+        except KeyError:
+            self.conditions[condition] = ConditionStats(**self.statkwargs)
+            return self.conditions[condition]
+
+    @property
+    def current(self):
+        '''ConditionStats for the current condition.'''
+        return self[self.condition]
+
+    def newtrial(self):
+        '''
+        start a new trial in the current condition and the total. Called
+        by EventSeq.setcondition as each named condition starts.
+        '''
+        self.total.newtrial()
+        self.current.newtrial()
+        return
+
+    def update(self, scores, rts):
+        '''add scored responses to the current condition and the total.'''
+        self.total.update(scores, rts)
+        self.current.update(scores, rts)
+        return
+
+    def summary(self):
+        '''
+        return a pandas DataFrame with one row of summary statistics per
+        condition (and a final row, 'total', over all conditions).
+        '''
+        rows = [self.conditions[key].summary() for key in self.conditions]
+        rows.append(self.total.summary())
+        return pandas.DataFrame(rows, index=list(self.conditions) + ['total'])
+
+def lastscore(stats):
+    '''
+    FeedbackEvent scorer (usestats=True) that returns the score of the most
+    recent response in the current trial of the current condition (nan if
+    there was no scored response since the condition started).
+    '''
+    return stats.current.lastscore
+
+def windowcriterion(criterion, condition=False):
+    '''
+    Return a FeedbackEvent scorer (usestats=True) that scores 1 if sliding
+    window accuracy is at least criterion, 0 if below, and nan before any
+    responses have been scored. If condition, only the current condition
+    is considered.
+    '''
+    def scorer(stats): # pylint: disable=missing-docstring
+        thisstats = stats.total
+        if condition:
+            thisstats = stats.current
+        accuracy = thisstats.windowaccuracy
+        if numpy.isnan(accuracy):
+            return numpy.nan
+        return float(accuracy >= criterion)
+    return scorer
@@ -0,0 +1,206 @@
+'''
+Live telemetry for expcontrol. A TelemetryPublisher attached to the
+Controller writes a small fixed-layout status block to a memory-mapped file
+after each event, and a separate monitor process reads it with
+TelemetryMonitor (or python -m expcontrol.telemetry). This gives the
+operator a view of progress without console I/O in the presentation
+process.
+'''
+import os
+import sys
+import time
+import mmap
+import struct
+import tempfile
+import numpy
+
+# little-endian, no padding: sequence counter, trial index, number of scored
+# responses, number of correct responses, frame drops, condition, event name,
+# pulse period, lag behind schedule, clock time of last update
+LAYOUT = struct.Struct('<Iiiii32s32sddd')
+FIELDS = ['trial', 'nscored', 'ncorrect', 'nframedrops', 'condition', 'name',
+          'period', 'lag', 'time']
+
+def defaultpath():
+    '''
+    Return the default location of the telemetry block (in shared memory if
+    /dev/shm is available, otherwise in the temp directory).
+    '''
+    basedir = '/dev/shm'
+    if not os.path.isdir(basedir):
+        basedir = tempfile.gettempdir()
+    return os.path.join(basedir, 'expcontrol-telemetry')
+
+def fixedstr(val):
+    '''Convert val to a str that fits the fixed-width text fields.'''
+    if val is None:
+        return ''
+    return str(val)[:32]
+
+class TelemetryPublisher(object):
+    '''
+    Publish experiment progress to a memory-mapped status block. Attach to
+    Controller (telemetry keyword) and EventSeq instances will call newtrial
+    as each named condition starts, and Event.__call__ will call publish at
+    the end of each event.
+
+    Writes use a sequence counter (odd while writing) so readers never see a
+    half-updated block.
+    '''
+
+    def __init__(self, path=None):
+        '''
+        Initialise a TelemetryPublisher instance.
+
+        Keyword arguments:
+        path -- location of the status block (default defaultpath()).
+        '''
+        if path is None:
+            path = defaultpath()
+        self.path = path
+        self.filehand = open(path, 'w+b')
+        self.filehand.truncate(LAYOUT.size)
+        self.block = mmap.mmap(self.filehand.fileno(), LAYOUT.size)
+        self.sequence = 0
+        self.condition = None
+        self.trial = -1
+        self.nscored = 0
+        self.ncorrect = 0
+        return
+
+    def newtrial(self, condition):
+        '''
+        start a new trial in condition. Called by EventSeq.setcondition.
+        '''
+        self.trial += 1
+        self.condition = condition
+        return
+
+    def publish(self, controller, name, endtime, resplog, scored=True):
+        '''
+        Update the running counts and write the status block. Typically
+        called from Event.__call__.
+
+        Arguments:
+        controller -- Controller instance
+        name -- name of the event that just ended.
+        endtime -- the scheduled end of the event in controller.clock units.
+            Lag is reported relative to this (nan if endtime is inf).
+        resplog -- response log for the event (see event.prepresprow).
+
+        Keyword arguments:
+        scored=True -- count the scores in resplog towards accuracy. False
+            for events that score something other than performance (e.g.
+            pulses in SynchEvent). Ignored if controller.stats is defined,
+            since accuracy is then taken from its total.
+        '''
+        now = controller.clock()
+        if controller.stats:
+            self.nscored = controller.stats.total.nscored
+            self.ncorrect = controller.stats.total.ncorrect
+        elif scored and len(resplog):
+            scores = resplog['onresponse_score'].values.astype(float)
+            self.nscored += int(numpy.sum(~numpy.isnan(scores)))
+            self.ncorrect += int(numpy.sum(scores == 1))
+        lag = numpy.nan
+        if numpy.isfinite(endtime):
+            lag = now - endtime
+        self.write(trial=self.trial, nscored=self.nscored,
+                   ncorrect=self.ncorrect,
+                   nframedrops=controller.nframedrops,
+                   condition=fixedstr(self.condition),
+                   name=fixedstr(name),
+                   period=getattr(controller.clock, 'period', numpy.nan),
+                   lag=lag, time=now)
+        return
+
+    def write(self, **kwargs):
+        '''Write the status block. Keyword arguments as in FIELDS.'''
+        values = [kwargs[key] for key in FIELDS]
+        # odd sequence number flags a write in progress
+        self.sequence += 1
+        struct.pack_into('<I', self.block, 0, self.sequence)
+        LAYOUT.pack_into(self.block, 0, self.sequence, *values)
+        self.sequence += 1
+        struct.pack_into('<I', self.block, 0, self.sequence)
+        return
+
+    def close(self):
+        '''Close the status block. The file is left for late readers.'''
+        self.block.close()
+        self.filehand.close()
+        return
+
+class TelemetryMonitor(object):
+    '''
+    Read the status block written by a TelemetryPublisher, typically from a
+    separate process.
+    '''
+
+    def __init__(self, path=None):
+        '''
+        Initialise a TelemetryMonitor instance.
+
+        Keyword arguments:
+        path -- location of the status block (default defaultpath()).
+        '''
+        if path is None:
+            path = defaultpath()
+        self.path = path
+        self.filehand = open(path, 'rb')
+        self.block = mmap.mmap(self.filehand.fileno(), LAYOUT.size,
+                               access=mmap.ACCESS_READ)
+        return
+
+    def __call__(self):
+        '''
+        Return a consistent snapshot of the status block as a dict, or None
+        if nothing has been published yet.
+        '''
+        while True:
+            before = struct.unpack_from('<I', self.block, 0)[0]
+            if before == 0:
+                return None
+            values = LAYOUT.unpack_from(self.block, 0)
+            after = struct.unpack_from('<I', self.block, 0)[0]
+            if not before % 2 and values[0] == before == after:
+                break
+        status = dict(zip(FIELDS, values[1:]))
+        for key in ('condition', 'name'):
+            status[key] = status[key].rstrip('\x00')
+        status['accuracy'] = numpy.nan
+        if status['nscored']:
+            status['accuracy'] = status['ncorrect'] / float(status['nscored'])
+        return status
+
+    def close(self):
+        '''Close the status block.'''
+        self.block.close()
+        self.filehand.close()
+        return
+
+def monitor(path=None, interval=.5):
+    '''
+    Print a status line to the console whenever the status block changes.
+    Runs until interrupted.
+    '''
+    reader = TelemetryMonitor(path)
+    lasttime = None
+    try:
+        while True:
+            status = reader()
+            if status and status['time'] != lasttime:
+                lasttime = status['time']
+                sys.stdout.write('%(time)8.2f trial=%(trial)d '
+                                 'condition=%(condition)s event=%(name)s '
+                                 'acc=%(accuracy).2f drops=%(nframedrops)d '
+                                 'tr=%(period).3f lag=%(lag).3f\n' % status)
+                sys.stdout.flush()
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    reader.close()
+    return
+
+if __name__ == '__main__':
+    monitor(*sys.argv[1:2])
@@ -0,0 +1,97 @@
+'''Tests for expcontrol.adaptive: python -m unittest discover tests'''
+import unittest
+import numpy
+import pandas
+from expcontrol import adaptive, event, simulation
+
+class TestStaircase(unittest.TestCase):
+    '''transformed up/down staircase.'''
+
+    def test_steps(self):
+        '''steps down after ndown correct and up after nup incorrect.'''
+        staircase = adaptive.Staircase(1., .1, stepup=.2, ndown=2, nup=1,
+                                       maxval=1.)
+        intensities = []
+        for score in (1, 1, 1, 1, 0, 0, 1, 1):
+            intensities.append(staircase())
+            staircase.update(staircase(), score)
+        numpy.testing.assert_allclose(
+            intensities, [1., 1., .9, .9, .8, 1., 1., 1.])
+        numpy.testing.assert_allclose(staircase.reversals, [.8, 1.])
+        self.assertAlmostEqual(staircase(), .9)
+
+class TestGridPosterior(unittest.TestCase):
+    '''grid-based Bayesian threshold estimation.'''
+
+    def test_entropy(self):
+        '''next intensity minimises the expected posterior entropy.'''
+        grid = adaptive.GridPosterior(numpy.linspace(-2., 0., 21))
+        grid.update(-1., 1)
+        grid.update(-1.5, 0)
+        expected = numpy.zeros(len(grid.intensities))
+        for likelihood in (grid.pcorrect, grid.pincorrect):
+            joint = likelihood * grid.posterior
+            marginal = joint.sum(axis=1)[:, None]
+            post = joint / marginal
+            expected += marginal[:, 0] * -numpy.sum(
+                post * numpy.log(post), axis=1)
+        self.assertEqual(grid(), grid.intensities[numpy.argmin(expected)])
+
+    def test_convergence(self):
+        '''the estimate converges on the simulated threshold.'''
+        rng = numpy.random.RandomState(0)
+        grid = adaptive.GridPosterior(numpy.linspace(-2., 0., 41))
+        # simulated observer with the same psychometric function
+        observer = adaptive.GridPosterior(grid.intensities, thresholds=[-1.2])
+        for _ in range(200):
+            intensity = grid()
+            pcorrect = observer.pcorrect[observer.intensityindex(intensity), 0]
+            grid.update(intensity, float(rng.uniform() < pcorrect))
+        mean, sd = grid.estimate()
+        self.assertLess(abs(mean + 1.2), 2 * sd + .05)
+
+class CountingStaircase(adaptive.Staircase):
+    '''Staircase that records the virtual time of each intensity choice.'''
+
+    def __init__(self, clock, *args, **kwargs):
+        super(CountingStaircase, self).__init__(*args, **kwargs)
+        self.clock = clock
+        self.calltimes = []
+        return
+
+    def __call__(self):
+        self.calltimes.append(self.clock())
+        return super(CountingStaircase, self).__call__()
+
+class TestAdaptiveEvent(unittest.TestCase):
+    '''adaptive intensity in the event loop.'''
+
+    def test_intensity_after_stimulus(self):
+        '''the next intensity is chosen after the stimulus and logged.'''
+        controller = simulation.ReplayController(
+            pandas.DataFrame({'key': ['a', 'b']}, index=[.5, 2.5]),
+            frameperiod=.01)
+        controller.clock.start()
+        staircase = CountingStaircase(controller.clock, 1., .1, ndown=1)
+        applied = []
+        stimulus = adaptive.AdaptiveEvent([], staircase, applied.append,
+                                          correct='a', incorrect='b',
+                                          duration=1., name='stim')
+        trials = [event.EventSeqAbsTime(
+            [stimulus, event.Event(name='iti', duration=1.)])
+                  for _ in range(3)]
+        evlog, _ = event.EventSeqAbsTime(trials)(controller)
+        stim = evlog[evlog['name'] == 'stim']
+        numpy.testing.assert_allclose(stim['oncall'].astype(float), [1., .9, 1.])
+        numpy.testing.assert_allclose(applied, [1., .9, 1.])
+        # no response on the last trial, so no update
+        numpy.testing.assert_allclose(stim['onend'].astype(float),
+                                      [1., 0., numpy.nan])
+        # one choice on construction, then one after each update
+        self.assertEqual(len(staircase.calltimes), 3)
+        for calltime, deadline, offset in zip(
+                staircase.calltimes[1:], stim['deadline'], stim['offset']):
+            self.assertTrue(deadline <= calltime <= offset)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+'''Tests for expcontrol.align: python -m unittest discover tests'''
+import unittest
+import numpy
+import pandas
+from expcontrol import align
+
+EVENTLOG = pandas.DataFrame({'name': ['stim', 'iti', 'stim'],
+                             'condition': ['A', 'A', numpy.nan],
+                             'offset': [.8, 2., 3.]},
+                            index=[0., 1., 2.])
+TIMES = [-.5, .5, .9, 1.5, 2.5, 3.5]
+
+class TestAssignEvents(unittest.TestCase):
+    '''assignment of time stamps to their enclosing events.'''
+
+    def test_assign(self):
+        '''times go to the last onset before them, flagged by offset.'''
+        aligned = align.assignevents(TIMES, EVENTLOG)
+        self.assertEqual(list(aligned['event']), [-1, 0, 0, 1, 2, 2])
+        self.assertEqual(list(aligned['inevent']),
+                         [False, True, False, True, True, False])
+        numpy.testing.assert_allclose(aligned['eventtime'],
+                                      [numpy.nan, .5, .9, .5, .5, 1.5])
+        self.assertEqual(list(aligned['name'].astype(object).fillna('')),
+                         ['', 'stim', 'stim', 'iti', 'stim', 'stim'])
+        # events without a condition and times before the first event
+        self.assertEqual(list(aligned['condition'].isnull()),
+                         [True, False, False, False, True, True])
+
+    def test_strict(self):
+        '''strict drops times after the event's offset.'''
+        aligned = align.assignevents(TIMES, EVENTLOG, strict=True)
+        self.assertEqual(list(aligned['event']), [-1, 0, -1, 1, 2, -1])
+        self.assertEqual(list(aligned['name'].isnull()),
+                         [True, False, True, False, False, True])
+        numpy.testing.assert_allclose(aligned['eventtime'],
+                                      [numpy.nan, .5, numpy.nan, .5, .5,
+                                       numpy.nan])
+
+    def test_offset_correction(self):
+        '''a scalar correction shifts times before assignment.'''
+        aligned = align.assignevents(numpy.array(TIMES) - 10., EVENTLOG,
+                                     correction=10.)
+        self.assertEqual(list(aligned['event']), [-1, 0, 0, 1, 2, 2])
+        numpy.testing.assert_allclose(aligned['alignedtime'], TIMES)
+
+class TestFitClock(unittest.TestCase):
+    '''linear clock correction.'''
+
+    def test_fitclock(self):
+        '''offset and drift are recovered despite an outlier.'''
+        source = numpy.arange(0., 100., 2.)
+        target = 1.001 * source - 3.
+        target[10] += 1.
+        correction = align.fitclock(source, target)
+        numpy.testing.assert_allclose(correction, [1.001, -3.], atol=1e-9)
+        aligned = align.assignevents(
+            (numpy.array(TIMES) + 3.) / 1.001, EVENTLOG,
+            correction=correction)
+        numpy.testing.assert_allclose(aligned['alignedtime'], TIMES)
+        self.assertEqual(list(aligned['event']), [-1, 0, 0, 1, 2, 2])
+
+class TestAlignStreams(unittest.TestCase):
+    '''alignment of several streams at once.'''
+
+    def test_streams(self):
+        '''each stream keeps its own columns and gets the assignment.'''
+        resplog = pandas.DataFrame({'key': ['a', 'b']}, index=[.5, 2.5])
+        aligned = align.alignstreams(EVENTLOG, resplog=resplog,
+                                     pulsetimes=[0., 2.],
+                                     periodhistory=[numpy.nan, 2.],
+                                     corrections={'pulses': .1})
+        self.assertEqual(sorted(aligned), ['pulses', 'responses'])
+        self.assertEqual(list(aligned['responses']['key']), ['a', 'b'])
+        self.assertEqual(list(aligned['responses']['event']), [0, 2])
+        numpy.testing.assert_allclose(aligned['pulses']['alignedtime'],
+                                      [.1, 2.1])
+        numpy.testing.assert_allclose(aligned['pulses']['period'],
+                                      [numpy.nan, 2.])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+'''Tests for expcontrol.base: python -m unittest discover tests'''
+import unittest
+import numpy
+import pandas
+from expcontrol import base, event, psychopydep, simulation
+
+class RecordedDevice(object):
+    '''response device that returns recorded keys as virtual time passes.'''
+
+    def __init__(self, timer, times, keys):
+        self.timer = timer
+        self.times = numpy.asarray(times, dtype=float)
+        self.keys = numpy.asarray(keys)
+        self.nextresp = 0
+        return
+
+    def __call__(self):
+        stop = numpy.searchsorted(self.times, self.timer.getTime(),
+                                  side='right')
+        start, self.nextresp = self.nextresp, max(stop, self.nextresp)
+        return (self.keys[start:self.nextresp],
+                self.times[start:self.nextresp])
+
+class TestResponseMux(unittest.TestCase):
+    '''merged polling of several devices.'''
+
+    def setUp(self):
+        self.timer = simulation.VirtualTimer()
+        self.mux = base.ResponseMux(
+            {'kb': RecordedDevice(self.timer, [.3, .7], ['a', 'b']),
+             'scanner': RecordedDevice(self.timer, [.5], ['5'])},
+            clock=simulation.VirtualClock(self.timer))
+        self.controller = base.Controller(
+            window=simulation.ReplayWindow(self.timer, .01),
+            response=self.mux, clock=simulation.VirtualClock(self.timer))
+        return
+
+    def test_device_column(self):
+        '''responses are logged with their device.'''
+        _, resplog = event.Event(duration=1.)(self.controller, 1.)
+        self.assertEqual(list(resplog['key']), ['a', '5', 'b'])
+        self.assertEqual(list(resplog['device']), ['kb', 'scanner', 'kb'])
+
+    def test_subscription_default(self):
+        '''subscribed keys still reach events unless consumed.'''
+        subscription = self.mux.subscribe('5')
+        consumed = self.mux.subscribe('a', consume=True)
+        _, resplog = event.Event(duration=1.)(self.controller, 1.)
+        self.assertEqual(list(resplog['key']), ['5', 'b'])
+        self.assertEqual(list(subscription()[0]), ['5'])
+        self.assertEqual(list(consumed()[0]), ['a'])
+
+class MuxPulseClock(psychopydep.PulseClock):
+    '''PulseClock that waits on virtual time.'''
+
+    def wait(self, time):
+        self.ppclock.advance(time)
+        return
+
+class TestPulseSubscription(unittest.TestCase):
+    '''PulseClock on a ResponseMux subscription.'''
+
+    def test_start_pulse(self):
+        '''the pulse that starts the clock is not replayed to events.'''
+        timer = simulation.VirtualTimer()
+        mux = base.ResponseMux(
+            {'scanner': simulation.PulseSource(timer, period=2., onset=1.3)},
+            clock=simulation.VirtualClock(timer))
+        clock = MuxPulseClock('5', 2., ppclock=timer,
+                              keyhand=mux.subscribe('5'))
+        controller = base.Controller(
+            window=simulation.ReplayWindow(timer, .01), response=mux,
+            clock=clock)
+        clock.start()
+        evlog, _ = event.EventSeqSynchTime(
+            [event.SynchEvent([], '5'), event.Event(name='stim', duration=.9),
+             event.SynchEvent([], '5'),
+             event.Event(name='stim', duration=.9)])(controller)
+        synch = evlog[evlog['name'] == 'synch']
+        # anchored on the next pulses, at 2 and 4 s after the start pulse
+        numpy.testing.assert_allclose(synch['resynch'].values, [2., 1.1],
+                                      atol=.02)
+        stim = evlog[evlog['name'] == 'stim']
+        numpy.testing.assert_allclose(stim['deadline'].values, [2.9, 4.9],
+                                      atol=.02)
+
+class TestGCMode(unittest.TestCase):
+    '''safe-point garbage collection.'''
+
+    def run_gcmode(self, gcmode):
+        '''run two trials without catch-up time and return the log.'''
+        controller = simulation.ReplayController(
+            pandas.DataFrame({'key': []}), gcmode=gcmode)
+        controller.clock.start()
+        trials = [event.EventSeqAbsTime(
+            [event.Event(name='stim', duration=.5),
+             event.Event(name='iti', duration=.5, minduration=.3)])
+                  for _ in range(2)]
+        with controller:
+            evlog, _ = event.EventSeqRelTime(trials)(controller)
+        return controller, evlog
+
+    def test_flexible_safe_point(self):
+        '''events with slack collect even without catch-up time.'''
+        controller, evlog = self.run_gcmode('disable')
+        self.assertEqual(controller.ncollections, 2)
+        self.assertTrue(evlog['allocations'].notnull().all())
+        self.assertAlmostEqual(evlog['gcpause'].sum(), controller.gcpause)
+
+    def test_no_gcmode(self):
+        '''gc columns are nan without gcmode.'''
+        controller, evlog = self.run_gcmode(None)
+        self.assertEqual(controller.ncollections, 0)
+        self.assertTrue(evlog[event.GCKEYS].isnull().all().all())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,202 @@
+'''
+Tests for expcontrol.event timing, run on virtual time (see
+expcontrol.simulation) so that no psychopy is needed:
+python -m unittest discover tests
+'''
+import unittest
+import numpy
+import pandas
+from expcontrol import base, event, audit, simulation
+
+def makecontroller(frameperiod=.01, **kwargs):
+    '''return a started ReplayController without responses.'''
+    controller = simulation.ReplayController(
+        pandas.DataFrame({'key': []}), frameperiod=frameperiod, **kwargs)
+    controller.clock.start()
+    return controller
+
+class SlowEnd(event.Event):
+    '''Event that blocks for extra s in onend.'''
+
+    def __init__(self, extra=0., **kwargs):
+        super(SlowEnd, self).__init__(**kwargs)
+        self.extra = extra
+        return
+
+    def onend(self, controller, currentevlog, currentresplog):
+        controller.clock.wait(self.extra)
+        return
+
+class TestSchedule(unittest.TestCase):
+    '''scheduled vs actual timing in the event log.'''
+
+    def test_nested_reltime(self):
+        '''nested EventSeqRelTime conditions advance the schedule.'''
+        conditions = [event.EventSeqRelTime(
+            [event.Event(name='stim', duration=1.),
+             event.Event(name='iti', duration=.5)], name='A')
+                      for _ in range(3)]
+        evlog, _ = event.EventSeqRelTime(conditions)(makecontroller())
+        numpy.testing.assert_allclose(
+            evlog['scheduledonset'].values[::2], [0., 1.5, 3.])
+        result = audit.timingaudit(evlog)
+        # each event can only slip by about a frame
+        self.assertLess(result['onsetlag'].abs().max(), .1)
+
+    def test_nested_synchtime(self):
+        '''nested sequences in EventSeqSynchTime advance the schedule.'''
+        conditions = [event.EventSeqRelTime(
+            [event.Event(name='stim', duration=1.)], name='A')
+                      for _ in range(3)]
+        evlog, _ = event.EventSeqSynchTime(conditions)(makecontroller())
+        numpy.testing.assert_allclose(evlog['scheduledonset'].values,
+                                      [0., 1., 2.])
+
+    def test_resynch(self):
+        '''each re-anchoring is logged, including timeouts.'''
+        controller = makecontroller(pulsetimes=[.3])
+        evlog, _ = event.EventSeqSynchTime(
+            [event.SynchEvent([], '5', duration=1.),
+             event.Event(name='stim', duration=.9),
+             event.SynchEvent([], '5', duration=1.),
+             event.Event(name='stim', duration=.9)])(controller)
+        synch = evlog[evlog['name'] == 'synch']
+        # pulse at .3, then a timeout 1 s after the scheduled 1.2
+        numpy.testing.assert_allclose(synch['resynch'].values, [.3, 1.],
+                                      atol=.02)
+        stim = evlog[evlog['name'] == 'stim']
+        numpy.testing.assert_allclose(stim['deadline'].values,
+                                      [1.2, synch.index[1] + 1. + .9],
+                                      atol=.02)
+
+    def test_onend_overrun(self):
+        '''time spent in onend counts as overrun.'''
+        evlog, _ = event.EventSeqAbsTime(
+            [SlowEnd(extra=.3, name='slow', duration=1.),
+             event.Event(name='next', duration=1.)])(makecontroller())
+        result = audit.timingaudit(evlog)
+        self.assertGreaterEqual(result['overrun'].iloc[0], .3)
+        self.assertGreaterEqual(result['truncation'].iloc[1], .3)
+
+class FrameCounter(event.Event):
+    '''Event that returns the number of frames so far from onframe.'''
+
+    def __init__(self, **kwargs):
+        super(FrameCounter, self).__init__(frametrace=True, **kwargs)
+        self.nframes = 0
+        return
+
+    def onframe(self, controller, currentevlog, currentresplog):
+        self.nframes += 1
+        return self.nframes
+
+class TestFrameTrace(unittest.TestCase):
+    '''frame-by-frame logging.'''
+
+    def test_runs(self):
+        '''the trace holds the frames of the last run only.'''
+        controller = makecontroller(frametrace=event.FrameTrace(size=8))
+        counter = FrameCounter(name='stim', duration=.5)
+        experiment = base.Experiment(
+            {'a': event.EventSeqAbsTime([counter])}, subject='s',
+            context='c')
+        for _ in range(2):
+            eventlog = experiment(controller, ['a', 'a'])[0]
+            framelog = controller.frametrace.tolog()
+            self.assertEqual(list(framelog['event'].unique()),
+                             list(eventlog.index))
+        # 50 frames per event, counted over both runs
+        self.assertEqual(len(framelog), 100)
+        self.assertEqual(list(framelog['onframe'].iloc[[0, -1]]),
+                         [101, 200])
+        numpy.testing.assert_allclose(numpy.diff(framelog.index), .01)
+
+def lagtrial(extra=0., lagpolicy='truncate'):
+    '''return a trial with a stimulus that overruns by extra s.'''
+    return event.EventSeqAbsTime(
+        [SlowEnd(extra=extra, name='stim', duration=.5),
+         event.Event(name='iti', duration=1., minduration=.6)],
+        lagpolicy=lagpolicy)
+
+class TestLagPolicy(unittest.TestCase):
+    '''recovery of lag in EventSeqAbsTime.'''
+
+    def runflat(self, lagpolicy):
+        '''run 4 trials in a single sequence, the first overruns by .6 s.'''
+        events = []
+        for extra in (.6, 0., 0., 0.):
+            events += lagtrial(extra).events
+        controller = makecontroller()
+        evlog, _ = event.EventSeqAbsTime(events, lagpolicy=lagpolicy)(
+            controller)
+        return controller, evlog
+
+    def assertminduration(self, evlog):
+        '''no iti may be cut below its minduration (allowing a frame).'''
+        iti = evlog[evlog['name'] == 'iti']
+        self.assertTrue(numpy.all(iti['offset'] - iti.index >= .6 - .011))
+
+    def test_truncate(self):
+        '''the next event absorbs the full lag.'''
+        controller, evlog = self.runflat('truncate')
+        result = audit.timingaudit(evlog)
+        self.assertAlmostEqual(result['truncation'].iloc[1], .6, places=2)
+        self.assertAlmostEqual(controller.clock(), 6., delta=.02)
+
+    def test_greedy(self):
+        '''lag is taken from the first available slack.'''
+        controller, evlog = self.runflat('greedy')
+        iti = evlog[evlog['name'] == 'iti']
+        numpy.testing.assert_allclose(iti['correction'].values[:2],
+                                      [.4, .2], atol=.02)
+        self.assertminduration(evlog)
+        self.assertAlmostEqual(controller.clock(), 6., delta=.02)
+
+    def test_spread(self):
+        '''lag is shared between the remaining slack.'''
+        controller, evlog = self.runflat('spread')
+        iti = evlog[evlog['name'] == 'iti']
+        # .6 s lag over 4 itis with .4 s slack each
+        self.assertAlmostEqual(iti['correction'].iloc[0], .15, places=2)
+        self.assertTrue(numpy.all(iti['correction'] > .1))
+        self.assertminduration(evlog)
+        self.assertAlmostEqual(controller.clock(), 6., delta=.02)
+
+    def test_nested(self):
+        '''nested trials recover lag and keep to the caller's schedule.'''
+        for lagpolicy in ('greedy', 'spread'):
+            trials = [lagtrial(extra, lagpolicy) for extra in
+                      (.6, 0., 0., 0.)]
+            controller = makecontroller()
+            evlog, _ = event.EventSeqAbsTime(trials, lagpolicy=lagpolicy)(
+                controller)
+            stim = evlog[evlog['name'] == 'stim']
+            # the first trial recovers its own lag as far as its slack allows
+            self.assertAlmostEqual(stim.index[1], 1.7, delta=.02)
+            self.assertminduration(evlog)
+            self.assertAlmostEqual(controller.clock(), 6., delta=.02)
+
+    def test_nested_reltime(self):
+        '''the correction for a nested EventSeqRelTime is logged once.'''
+        cues = event.EventSeqRelTime([event.Event(name='cue', duration=.1),
+                                      event.Event(name='cue', duration=.1)])
+        evlog, _ = event.EventSeqAbsTime(
+            [SlowEnd(extra=.3, name='stim', duration=.5), cues])(
+                makecontroller())
+        cue = evlog[evlog['name'] == 'cue']
+        numpy.testing.assert_allclose(cue['lag'].values, [.3, numpy.nan],
+                                      atol=.02)
+        numpy.testing.assert_allclose(cue['correction'].values,
+                                      [.3, numpy.nan], atol=.02)
+
+    def test_nested_infinite_duration(self):
+        '''sequences without a fixed end ignore the caller's endtime.'''
+        sequence = event.EventSeqAbsTime(
+            [event.Event(name='stim', duration=.5)], duration=numpy.inf,
+            lagpolicy='greedy')
+        evlog, _ = sequence(makecontroller(), 2.)
+        self.assertTrue(numpy.all(numpy.isfinite(evlog['deadline'])))
+        numpy.testing.assert_allclose(evlog['scheduledonset'].values, [0.])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+'''Tests for expcontrol.eyelinkasc: python -m unittest discover tests'''
+import os
+import tempfile
+import unittest
+import numpy
+from expcontrol import eyelinkasc
+
+ASC = ('MSG 1000 stim\n'
+       '1000 1.0 2.0 300.0 ...\n'
+       '1002 1.5 2.5 301.0 ...\n'
+       'END 1004 SAMPLES')
+
+class TestReadAsc(unittest.TestCase):
+    '''parsing of ASC exports.'''
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.asc')
+        os.write(handle, ASC)
+        os.close(handle)
+        return
+
+    def tearDown(self):
+        os.remove(self.path)
+        return
+
+    def test_no_trailing_newline(self):
+        '''a last line without newline is not parsed as a sample.'''
+        for chunksize in (16, 2**20):
+            samples = eyelinkasc.readasc(self.path, chunksize)['samples']
+            self.assertEqual(len(samples), 2)
+            for key in ('time', 'x', 'y', 'pupil'):
+                self.assertTrue(numpy.issubdtype(samples[key].dtype,
+                                                 numpy.number))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+'''Tests for expcontrol.lazy: python -m unittest discover tests'''
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from expcontrol import lazy
+
+class TestLazyModule(unittest.TestCase):
+    '''submodule access through LazyModule.'''
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        package = os.path.join(self.path, 'lazytestpkg')
+        os.mkdir(package)
+        for name, code in (('__init__.py', ''),
+                           ('good.py', 'value = 1\n'),
+                           ('broken.py', 'import lazytestmissingdep\n')):
+            with open(os.path.join(package, name), 'w') as handle:
+                handle.write(code)
+        sys.path.insert(0, self.path)
+        self.module = lazy.LazyModule('lazytestpkg')
+        return
+
+    def tearDown(self):
+        sys.path.remove(self.path)
+        for name in list(sys.modules):
+            if name.startswith('lazytestpkg'):
+                del sys.modules[name]
+        shutil.rmtree(self.path)
+        return
+
+    def test_submodule(self):
+        '''submodules are imported on access.'''
+        self.assertEqual(self.module.good.value, 1)
+
+    def test_missing_submodule(self):
+        '''missing attributes raise AttributeError.'''
+        self.assertRaises(AttributeError, getattr, self.module, 'missing')
+
+    def test_broken_submodule(self):
+        '''import errors inside a submodule are not masked.'''
+        with self.assertRaises(ImportError) as context:
+            self.module.broken
+        self.assertIn('lazytestmissingdep', str(context.exception))
+
+class TestImportCost(unittest.TestCase):
+    '''heavy dependencies stay out of the package imports.'''
+
+    def test_imports(self):
+        '''no forbidden module is loaded by the IMPORTCHECKS statements.'''
+        for statement, forbidden in lazy.IMPORTCHECKS:
+            _, modules = lazy.importcost(statement, repeat=1)
+            self.assertEqual(sorted(set(forbidden) & set(modules)), [],
+                             statement)
+
+if __name__ == '__main__':
+    unittest.main()
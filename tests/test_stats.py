@@ -0,0 +1,62 @@
+'''Tests for expcontrol.stats: python -m unittest discover tests'''
+import unittest
+import numpy
+import pandas
+from expcontrol import event, simulation, stats
+
+class TestConditionStats(unittest.TestCase):
+    '''streaming summaries.'''
+
+    def test_update(self):
+        '''batched updates match summaries over all responses.'''
+        rng = numpy.random.RandomState(0)
+        rts = rng.uniform(.2, 1., 100)
+        scores = (rng.uniform(size=100) > .3).astype(float)
+        scores[::10] = numpy.nan
+        condstats = stats.ConditionStats(window=5)
+        for start in range(0, 100, 7):
+            condstats.update(scores[start:start+7], rts[start:start+7])
+        scored = ~numpy.isnan(scores)
+        self.assertEqual(condstats.nscored, numpy.sum(scored))
+        self.assertAlmostEqual(condstats.accuracy,
+                               numpy.mean(scores[scored]))
+        self.assertAlmostEqual(condstats.rtmean, numpy.mean(rts[scored]))
+        self.assertAlmostEqual(condstats.rtvar,
+                               numpy.var(rts[scored], ddof=1))
+        self.assertAlmostEqual(condstats.rtquantile(.5),
+                               numpy.median(rts[scored]), delta=.01)
+        self.assertAlmostEqual(condstats.windowaccuracy,
+                               numpy.mean(scores[scored][-5:]))
+        self.assertAlmostEqual(condstats.windowrtmean,
+                               numpy.mean(rts[scored][-5:]))
+
+    def test_newtrial(self):
+        '''lastscore is reset at the start of each trial.'''
+        condstats = stats.ConditionStats()
+        condstats.update([0.], [.5])
+        self.assertEqual(condstats.lastscore, 0.)
+        condstats.newtrial()
+        self.assertTrue(numpy.isnan(condstats.lastscore))
+
+class TestRunningStats(unittest.TestCase):
+    '''statistics kept up to date during a run.'''
+
+    def test_feedback_after_synch(self):
+        '''feedback sees the trial's score after other detection events.'''
+        controller = simulation.ReplayController(
+            pandas.DataFrame({'key': ['a']}, index=[.5]), pulsetimes=[1.5],
+            frameperiod=.01, stats=stats.RunningStats())
+        controller.clock.start()
+        trial = event.EventSeqSynchTime(
+            [event.DecisionEvent([], correct='a', incorrect='b',
+                                 duration=1., name='stim'),
+             event.SynchEvent([], '5'),
+             event.FeedbackEvent([], stats.lastscore, usestats=True,
+                                 duration=.5, name='feedback')], name='A')
+        evlog, _ = trial(controller)
+        self.assertEqual(evlog.set_index('name').loc['feedback', 'oncall'],
+                         1.)
+        self.assertEqual(controller.stats['A'].nscored, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+'''Tests for expcontrol.telemetry: python -m unittest discover tests'''
+import os
+import shutil
+import tempfile
+import unittest
+import pandas
+from expcontrol import event, simulation, stats, telemetry
+
+class TestTelemetry(unittest.TestCase):
+    '''status published during a pulse-synched run.'''
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        blockpath = os.path.join(self.path, 'telemetry')
+        self.publisher = telemetry.TelemetryPublisher(blockpath)
+        self.monitor = telemetry.TelemetryMonitor(blockpath)
+        return
+
+    def tearDown(self):
+        self.monitor.close()
+        self.publisher.close()
+        shutil.rmtree(self.path)
+        return
+
+    def runtrials(self, **kwargs):
+        '''
+        run two trials of a decision and a pulse wait, with a correct
+        response in the first and an incorrect one in the second, and return
+        the final status.
+        '''
+        controller = simulation.ReplayController(
+            pandas.DataFrame({'key': ['a', 'b']}, index=[.5, 2.2]),
+            pulsetimes=[1.5, 3.5], frameperiod=.01,
+            telemetry=self.publisher, **kwargs)
+        controller.clock.start()
+        trials = [event.EventSeqSynchTime(
+            [event.DecisionEvent([], correct='a', incorrect='b',
+                                 duration=1., name='stim'),
+             event.SynchEvent([], '5')], name='A') for _ in range(2)]
+        event.EventSeqRelTime(trials)(controller)
+        return self.monitor()
+
+    def test_status(self):
+        '''trials are counted per condition and pulses are not scored.'''
+        status = self.runtrials()
+        self.assertEqual(status['trial'], 1)
+        self.assertEqual(status['condition'], 'A')
+        self.assertEqual(status['name'], 'synch')
+        self.assertEqual(status['nscored'], 2)
+        self.assertEqual(status['accuracy'], .5)
+
+    def test_stats(self):
+        '''accuracy is taken from controller.stats if defined.'''
+        status = self.runtrials(stats=stats.RunningStats())
+        self.assertEqual(status['nscored'], 2)
+        self.assertEqual(status['accuracy'], .5)
+
+if __name__ == '__main__':
+    unittest.main()